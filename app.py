@@ -1,7 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g, Response, send_from_directory
 import sqlite3
 import os
-from datetime import datetime
+import queue
+import re
+import tempfile
+import json
+import base64
+import bisect
+import csv
+import gzip
+import io
+import hashlib
+import hmac
+import threading
+import time
+import click
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from markupsafe import Markup, escape
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = 'secretkey'
@@ -11,6 +35,93 @@ app.secret_key = 'secretkey'
 # =====================
 DB_NAME = "barterzone.db"
 
+# Number of idle connections kept warm between requests
+app.config.setdefault('DB_POOL_SIZE', 8)
+
+# SQLite tuning profile. WAL lets readers keep going while a chat message or
+# rating is being written; busy_timeout makes writers wait instead of failing
+# with "database is locked". Any value can be overridden with an environment
+# variable such as BARTERZONE_SQLITE_SYNCHRONOUS=full.
+app.config.setdefault('SQLITE_PRAGMAS', {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -16000,  # negative = KiB, so roughly 16 MB per connection
+    'mmap_size': 134217728,
+    'temp_store': 'memory',
+    'busy_timeout': 5000,
+})
+for _pragma in app.config['SQLITE_PRAGMAS']:
+    _override = os.environ.get(f"BARTERZONE_SQLITE_{_pragma.upper()}")
+    if _override is not None:
+        app.config['SQLITE_PRAGMAS'][_pragma] = _override
+
+_db_pool = queue.LifoQueue(maxsize=app.config['DB_POOL_SIZE'])
+
+
+def apply_sqlite_pragmas(conn):
+    """Apply the SQLITE_PRAGMAS profile to a connection and return the values SQLite reports back"""
+    applied = {}
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        conn.execute(f"PRAGMA {name} = {value}")
+        applied[name] = conn.execute(f"PRAGMA {name}").fetchone()[0]
+    return applied
+
+
+def configure_database():
+    """Apply the SQLite profile once at startup and report what took effect"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            applied = apply_sqlite_pragmas(conn)
+        print("✅ SQLite profile applied: " + ", ".join(f"{name}={value}" for name, value in applied.items()))
+        return applied
+    except sqlite3.OperationalError as e:
+        print(f"❌ Error applying SQLite profile: {e}")
+        return {}
+
+
+def open_db_connection():
+    """Open a connection configured the way every request expects it"""
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    apply_sqlite_pragmas(conn)
+    # Load the schema now so the first real query doesn't pay for parsing it
+    conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    return conn
+
+
+def checkout_db_connection():
+    """Take an idle connection from the pool, opening a new one if none is left"""
+    try:
+        return _db_pool.get_nowait()
+    except queue.Empty:
+        return open_db_connection()
+
+
+def return_db_connection(conn):
+    """Hand a connection back to the pool, discarding any unfinished transaction"""
+    if conn.in_transaction:
+        conn.rollback()
+
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def get_db():
+    """Get the connection for the current request, checking one out of the pool on first use"""
+    if 'db' not in g:
+        g.db = checkout_db_connection()
+    return g.db
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the request's connection to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        return_db_connection(conn)
+
 
 def init_db():
     with sqlite3.connect(DB_NAME) as conn:
@@ -41,6 +152,8 @@ def init_db():
             item_Description TEXT,
             item_image TEXT,
             item_available BOOLEAN DEFAULT 1,
+            locked_by_trade_id INTEGER,
+            updated_at TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         );
         """)
@@ -70,6 +183,7 @@ def init_db():
             delivery_courier TEXT,
             tracking_number TEXT,
             cancellation_reason TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (offer_user_id) REFERENCES users (id),
             FOREIGN KEY (target_user_id) REFERENCES users (id),
             FOREIGN KEY (offer_item_id) REFERENCES items (items_id),
@@ -234,6 +348,43 @@ def init_db():
 
         print("✅ All database tables created successfully!")
 
+    create_indexes()
+
+
+# Secondary indexes for the lookups every page makes: items by owner, trades by
+# item or trader, chat messages by sender/receiver and ratings by rated user.
+HOT_PATH_INDEXES = [
+    ('idx_items_user_id', 'items', 'user_id'),
+    ('idx_items_locked_by_trade_id', 'items', 'locked_by_trade_id'),
+    ('idx_trades_offer_item_id', 'trades', 'offer_item_id'),
+    ('idx_trades_target_item_id', 'trades', 'target_item_id'),
+    ('idx_trades_offer_user_id', 'trades', 'offer_user_id'),
+    ('idx_trades_target_user_id', 'trades', 'target_user_id'),
+    ('idx_trade_messages_sender_receiver', 'trade_messages', 'sender_id, receiver_id'),
+    ('idx_trade_messages_receiver_sender', 'trade_messages', 'receiver_id, sender_id'),
+    ('idx_trade_arrangements_trade_id', 'trade_arrangements', 'trade_id'),
+    ('idx_trade_messages_negotiation_trade_id', 'trade_messages_negotiation', 'trade_id, created_at'),
+    ('idx_user_ratings_rated_user_id', 'user_ratings', 'rated_user_id'),
+    ('idx_user_reports_reported_user_id', 'user_reports', 'reported_user_id'),
+    ('idx_user_bans_user_id', 'user_bans', 'user_id, is_active'),
+    ('idx_user_bans_active_until', 'user_bans', 'is_active, banned_until'),
+]
+
+
+def create_indexes():
+    """Create the hot-path secondary indexes (safe to run on every startup)"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            for index_name, table, columns in HOT_PATH_INDEXES:
+                try:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+                except sqlite3.OperationalError as e:
+                    print(f"❌ Error creating {index_name}: {e}")
+            conn.execute("PRAGMA optimize")
+            print("✅ Secondary indexes are in place")
+    except Exception as e:
+        print(f"❌ Error creating indexes: {e}")
+
 
 def add_user_specific_delivery_columns():
     """Add user-specific delivery columns"""
@@ -283,17 +434,256 @@ def add_item_availability_column():
             print(f"❌ Error adding item_available: {e}")
 
 
+def add_item_lock_column():
+    """Add locked_by_trade_id column to items table and backfill it from existing trades"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            try:
+                conn.execute("ALTER TABLE items ADD COLUMN locked_by_trade_id INTEGER")
+                print("✅ Added locked_by_trade_id column to items table")
+
+                # Lock every item that is already part of a live or completed trade
+                conn.execute("""
+                    UPDATE items SET locked_by_trade_id = (
+                        SELECT MAX(t.trade_id) FROM trades t
+                        WHERE (t.offer_item_id = items.items_id OR t.target_item_id = items.items_id)
+                        AND t.trade_status IN ('pending', 'accepted', 'completed')
+                    )
+                """)
+                print("✅ Backfilled item locks from existing trades")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" in str(e):
+                    print("ℹ️ locked_by_trade_id column already exists")
+                else:
+                    print(f"❌ Error adding locked_by_trade_id: {e}")
+
+            # Listing pages only ever want items that are free to trade
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_items_free_by_user ON items (user_id)
+                WHERE item_available = 1 AND locked_by_trade_id IS NULL
+            """)
+    except Exception as e:
+        print(f"❌ Error adding item locks: {e}")
+
+
+def add_trade_version_column():
+    """Add the version counter the trade state machine checks on every transition"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            conn.execute("ALTER TABLE trades ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            print("✅ Added version column to trades table")
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e):
+            print("ℹ️ trades version column already exists")
+        else:
+            print(f"❌ Error adding trades version: {e}")
+
+
+def add_item_updated_at_column():
+    """Add items.updated_at, stamped by a trigger whenever an item's listed details change"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            try:
+                conn.execute("ALTER TABLE items ADD COLUMN updated_at TIMESTAMP")
+                print("✅ Added updated_at column to items table")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" in str(e):
+                    print("ℹ️ items updated_at column already exists")
+                else:
+                    raise
+
+            # Millisecond stamps, so two quick edits still give cached item cards different keys
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS items_touch_updated_at
+                AFTER UPDATE OF item_Name, item_Brand, item_Condition, item_DateBought,
+                                item_DateOffered, item_Description, item_image ON items
+                BEGIN
+                    UPDATE items SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                    WHERE items_id = new.items_id;
+                END
+            """)
+    except Exception as e:
+        print(f"❌ Error adding items updated_at: {e}")
+
+
+# Set by create_search_index(); search falls back to LIKE when SQLite lacks FTS5
+FTS5_AVAILABLE = False
+
+
+def create_search_index():
+    """Create the items_fts full-text index and the triggers that keep it in sync"""
+    global FTS5_AVAILABLE
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            exists = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='items_fts'"
+            ).fetchone()
+
+            try:
+                conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                        item_Name, item_Brand, item_Description, username, full_name,
+                        tokenize = 'unicode61 remove_diacritics 2',
+                        prefix = '2 3'
+                    )
+                """)
+            except sqlite3.OperationalError as e:
+                print(f"ℹ️ FTS5 not available, search will use LIKE: {e}")
+                FTS5_AVAILABLE = False
+                return
+
+            # Items carry their owner's names so one MATCH covers both tables
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN
+                    INSERT INTO items_fts (rowid, item_Name, item_Brand, item_Description, username, full_name)
+                    VALUES (new.items_id, new.item_Name, new.item_Brand, new.item_Description,
+                            (SELECT username FROM users WHERE id = new.user_id),
+                            (SELECT full_name FROM users WHERE id = new.user_id));
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS items_fts_update
+                AFTER UPDATE OF item_Name, item_Brand, item_Description, user_id ON items BEGIN
+                    DELETE FROM items_fts WHERE rowid = old.items_id;
+                    INSERT INTO items_fts (rowid, item_Name, item_Brand, item_Description, username, full_name)
+                    VALUES (new.items_id, new.item_Name, new.item_Brand, new.item_Description,
+                            (SELECT username FROM users WHERE id = new.user_id),
+                            (SELECT full_name FROM users WHERE id = new.user_id));
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN
+                    DELETE FROM items_fts WHERE rowid = old.items_id;
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username, full_name ON users BEGIN
+                    UPDATE items_fts SET username = new.username, full_name = new.full_name
+                    WHERE rowid IN (SELECT items_id FROM items WHERE user_id = new.id);
+                END
+            """)
+
+            if not exists:
+                conn.execute("""
+                    INSERT INTO items_fts (rowid, item_Name, item_Brand, item_Description, username, full_name)
+                    SELECT i.items_id, i.item_Name, i.item_Brand, i.item_Description, u.username, u.full_name
+                    FROM items i
+                    LEFT JOIN users u ON i.user_id = u.id
+                """)
+                print("✅ Built items_fts search index")
+
+            FTS5_AVAILABLE = True
+    except Exception as e:
+        print(f"❌ Error creating search index: {e}")
+
+
+def create_catalogue_version():
+    """Create the catalogue_state row whose version is bumped by every catalogue write"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS catalogue_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO catalogue_state (id, version) VALUES (1, 0)")
+
+            # Item writes (including trade locks/releases, which update items) and
+            # changes to what listings show about an owner all move the version on
+            bump = "UPDATE catalogue_state SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = 1;"
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS catalogue_items_insert AFTER INSERT ON items BEGIN {bump} END")
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS catalogue_items_update AFTER UPDATE ON items BEGIN {bump} END")
+            conn.execute(f"CREATE TRIGGER IF NOT EXISTS catalogue_items_delete AFTER DELETE ON items BEGIN {bump} END")
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS catalogue_users_update
+                AFTER UPDATE OF username, full_name, location, contact, is_admin ON users BEGIN {bump} END
+            """)
+            print("✅ Catalogue version counter ready")
+    except Exception as e:
+        print(f"❌ Error creating catalogue version: {e}")
+
+
+def create_conversations_table():
+    """Create the per-pair inbox summary maintained alongside trade_messages"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversations'"
+            ).fetchone()
+
+            # One row per pair of traders, stored low id first so both sides share it
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversations (
+                    user_low_id INTEGER NOT NULL,
+                    user_high_id INTEGER NOT NULL,
+                    last_message_id INTEGER NOT NULL,
+                    last_message_at TIMESTAMP NOT NULL,
+                    unread_low INTEGER NOT NULL DEFAULT 0,
+                    unread_high INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_low_id, user_high_id),
+                    FOREIGN KEY (user_low_id) REFERENCES users (id),
+                    FOREIGN KEY (user_high_id) REFERENCES users (id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_high ON conversations (user_high_id)")
+
+            if not exists:
+                # Backfill from the message history; earlier messages count as read
+                conn.execute("""
+                    INSERT INTO conversations (user_low_id, user_high_id, last_message_id, last_message_at)
+                    SELECT pair.user_low_id, pair.user_high_id, m.message_id, m.message_date
+                    FROM (
+                        SELECT MIN(sender_id, receiver_id) AS user_low_id,
+                               MAX(sender_id, receiver_id) AS user_high_id,
+                               MAX(message_id) AS last_message_id
+                        FROM trade_messages
+                        GROUP BY 1, 2
+                    ) pair
+                    JOIN trade_messages m ON m.message_id = pair.last_message_id
+                """)
+                print("✅ Conversations table created and backfilled")
+            else:
+                print("ℹ️ Conversations table already exists")
+    except Exception as e:
+        print(f"❌ Error creating conversations table: {e}")
+
+
+def create_user_events_table():
+    """Create the per-user event log that feeds the /events stream"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_user_events_user_id ON user_events (user_id, id)")
+            print("✅ User events table ready")
+    except Exception as e:
+        print(f"❌ Error creating user events table: {e}")
+
+
 def enhanced_migrate_database():
     """Enhanced database migration with user-specific delivery"""
     migrate_database()
     add_user_specific_delivery_columns()
     add_item_availability_column()
+    add_item_lock_column()
+    add_trade_version_column()
+    add_item_updated_at_column()
+    create_search_index()
+    create_catalogue_version()
+    create_conversations_table()
+    create_user_events_table()
 
 
-# Ensure DB exists
-if not os.path.exists(DB_NAME):
-    init_db()
-
 def add_item_availability_column():
     """Add item_available column to items table"""
     try:
@@ -364,6 +754,7 @@ def migrate_database():
                     item_Description TEXT,
                     item_image TEXT,
                     item_available BOOLEAN DEFAULT 1,
+                    locked_by_trade_id INTEGER,
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 );
                 """)
@@ -446,10 +837,679 @@ def migrate_database():
 
             print("🎉 Database migration completed successfully!")
             add_missing_columns()
+            create_indexes()
 
     except Exception as e:
         print(f"❌ Migration error: {e}")
 
+# =====================
+# MEDIA UPLOADS
+# =====================
+
+# Uploaded item images, stored by content hash under MEDIA_ROOT/<ab>/<hash>.<ext>
+app.config.setdefault('MEDIA_ROOT', os.path.join(app.root_path, 'media'))
+app.config.setdefault('MAX_IMAGE_BYTES', 5 * 1024 * 1024)
+# Bounding box of the WebP thumbnails shown on listing pages
+app.config.setdefault('THUMBNAIL_SIZE', (320, 320))
+# One year; for URLs whose content never changes (hashed uploads and built assets)
+IMMUTABLE_MAX_AGE = 31536000
+
+# Leading bytes of the image types we accept, and the extension each is stored under
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+MEDIA_NAME = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{64})\.(jpg|png|gif|webp)$')
+
+# Set by start_thumbnail_worker(); without Pillow listing pages show the full upload
+PILLOW_AVAILABLE = False
+_thumbnail_queue = queue.Queue()
+_thumbnails_ready = set()
+
+
+class ImageUploadError(ValueError):
+    """An uploaded file that isn't an image we can store"""
+
+
+def sniff_image_type(head):
+    """Extension for the image type whose signature starts head, or None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def media_path(name):
+    return os.path.join(app.config['MEDIA_ROOT'], *name.split('/'))
+
+
+def thumbnail_name(name):
+    return name.rsplit('.', 1)[0] + '-thumb.webp'
+
+
+def store_item_image(upload):
+    """Save an uploaded image under its SHA-256 and return its /media URL.
+
+    The file is hashed while it is copied, so memory use doesn't grow with its
+    size. Uploading the same picture twice stores it once.
+    """
+    head = upload.stream.read(16)
+    extension = sniff_image_type(head)
+    if extension is None:
+        raise ImageUploadError('Images must be JPEG, PNG, GIF or WebP files')
+
+    media_root = app.config['MEDIA_ROOT']
+    os.makedirs(media_root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=media_root, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > app.config['MAX_IMAGE_BYTES']:
+                    raise ImageUploadError(
+                        f"Images must be under {app.config['MAX_IMAGE_BYTES'] // (1024 * 1024)} MB"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = upload.stream.read(65536)
+
+        hex_digest = digest.hexdigest()
+        name = f"{hex_digest[:2]}/{hex_digest}.{extension}"
+        os.makedirs(os.path.dirname(media_path(name)), exist_ok=True)
+        os.replace(temp_path, media_path(name))
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    queue_thumbnail(name)
+    return url_for('media_file', filename=name)
+
+
+def item_image_from_form(current=None):
+    """The item_image value for an add/edit form: a new upload wins over the URL field"""
+    upload = request.files.get('item_image_file')
+    if upload and upload.filename:
+        return store_item_image(upload)
+    return request.form.get('item_image', current or '')
+
+
+def queue_thumbnail(name):
+    """Ask the worker for name's thumbnail unless it already exists"""
+    if PILLOW_AVAILABLE and not os.path.exists(media_path(thumbnail_name(name))):
+        _thumbnail_queue.put(name)
+
+
+def make_thumbnail(name):
+    """Write name's WebP thumbnail next to it (worker thread only)"""
+    from PIL import Image, ImageOps
+
+    target = media_path(thumbnail_name(name))
+    with Image.open(media_path(name)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(app.config['THUMBNAIL_SIZE'])
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.save(target + '.tmp', 'WEBP', quality=80)
+    os.replace(target + '.tmp', target)
+    _thumbnails_ready.add(name)
+
+
+def run_thumbnail_worker():
+    while True:
+        name = _thumbnail_queue.get()
+        try:
+            make_thumbnail(name)
+        except Exception as e:
+            print(f"❌ Thumbnail for {name} failed: {e}")
+
+
+def start_thumbnail_worker():
+    """Start the thumbnail thread and queue any upload that is still missing its thumbnail"""
+    global PILLOW_AVAILABLE
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        print("ℹ️ Pillow not installed, listing pages will show full-size uploads")
+        return
+
+    PILLOW_AVAILABLE = True
+    threading.Thread(target=run_thumbnail_worker, name='thumbnails', daemon=True).start()
+
+    media_root = app.config['MEDIA_ROOT']
+    if os.path.isdir(media_root):
+        for shard in os.listdir(media_root):
+            shard_dir = os.path.join(media_root, shard)
+            if os.path.isdir(shard_dir):
+                for filename in os.listdir(shard_dir):
+                    name = f"{shard}/{filename}"
+                    if MEDIA_NAME.match(name):
+                        queue_thumbnail(name)
+
+
+@app.template_filter('thumbnail')
+def thumbnail_url(image_url):
+    """Listing-size version of an item image: the WebP thumbnail of an upload once it exists.
+
+    Remote URLs and uploads without a thumbnail yet are returned unchanged.
+    """
+    prefix = url_for('media_file', filename='')
+    if not image_url or not image_url.startswith(prefix):
+        return image_url
+    name = image_url[len(prefix):]
+    if name not in _thumbnails_ready:
+        if not MEDIA_NAME.match(name) or not os.path.exists(media_path(thumbnail_name(name))):
+            return image_url
+        _thumbnails_ready.add(name)
+    return url_for('media_file', filename=thumbnail_name(name))
+
+
+@app.route('/media/<path:filename>')
+def media_file(filename):
+    """Serve an upload or thumbnail; its name is its hash, so it can be cached forever"""
+    response = send_from_directory(app.config['MEDIA_ROOT'], filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+# =====================
+# STATIC ASSETS
+# =====================
+
+# Written by build_assets.py: source path under static/ -> fingerprinted path under static/dist/
+ASSET_MANIFEST = os.path.join(app.static_folder, 'dist', 'manifest.json')
+_asset_manifest = {'mtime': None, 'entries': {}}
+
+
+def load_asset_manifest():
+    """The build manifest, re-read whenever build_assets.py rewrites it"""
+    try:
+        mtime = os.stat(ASSET_MANIFEST).st_mtime
+    except OSError:
+        return {}
+    if mtime != _asset_manifest['mtime']:
+        with open(ASSET_MANIFEST) as f:
+            _asset_manifest['entries'] = json.load(f)
+        _asset_manifest['mtime'] = mtime
+    return _asset_manifest['entries']
+
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file: its minified, fingerprinted build if there is one, else the source"""
+    built = load_asset_manifest().get(filename)
+    if built:
+        return url_for('static', filename=f'dist/{built}')
+    return url_for('static', filename=filename)
+
+
+@app.after_request
+def cache_built_assets(response):
+    """A fingerprinted file never changes under its name, so browsers may keep it for a year"""
+    filename = (request.view_args or {}).get('filename', '')
+    if request.endpoint == 'static' and filename.startswith('dist/') and filename != 'dist/manifest.json':
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+# =====================
+# FRAGMENT CACHE & COMPRESSION
+# =====================
+
+app.config.setdefault('FRAGMENT_CACHE_SIZE', 2048)
+app.config.setdefault('FRAGMENT_CACHE_TTL', 300)
+# Responses smaller than this aren't worth the compression overhead
+app.config.setdefault('COMPRESS_MIN_BYTES', 1024)
+app.config.setdefault('COMPRESS_MIMETYPES', {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'application/javascript',
+    'text/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+})
+
+
+class FragmentCache:
+    """LRU of rendered template fragments, each kept for at most ttl seconds"""
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, html):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+fragment_cache = FragmentCache(app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL'])
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 'name', key, ... %}...{% endcache %} renders its body once per distinct key.
+
+    Everything the body shows must be in the key: an item card is keyed by the
+    item's id, updated_at and whatever else of the row it prints.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        cache_key = json.dumps(key, default=str)
+        html = fragment_cache.get(cache_key)
+        if html is None:
+            html = str(caller())
+            fragment_cache.set(cache_key, html)
+        return Markup(html)
+
+
+app.jinja_env.add_extension(FragmentCacheExtension)
+
+
+def choose_content_encoding(accept_encoding):
+    """br when the client takes it and brotli is installed, else gzip, else None"""
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.lower().split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+@app.after_request
+def compress_response(response):
+    """Gzip (or brotli) text responses above COMPRESS_MIN_BYTES for clients that accept it"""
+    response.vary.add('Accept-Encoding')
+    # Generators (event streams, exports) go out unbuffered; static files are fine to read
+    streamed = response.is_streamed and not response.direct_passthrough
+    if (response.status_code != 200 or streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES']):
+        return response
+
+    encoding = choose_content_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+    if response.content_length is not None and response.content_length < app.config['COMPRESS_MIN_BYTES']:
+        return response
+
+    # Static files arrive as a file wrapper; read them so they can be compressed too
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+
+    if encoding == 'br':
+        data = brotli.compress(data, quality=5)
+    else:
+        data = gzip.compress(data, compresslevel=6)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # Same resource, different bytes: a weak ETag keeps If-None-Match revalidation working
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# =====================
+# PASSWORD HASHING
+# =====================
+
+# scrypt when this Python's OpenSSL has it, else PBKDF2; both are stdlib
+app.config.setdefault('PASSWORD_HASHER', os.environ.get('BARTERZONE_PASSWORD_HASHER', 'scrypt'))
+app.config.setdefault('PASSWORD_SCRYPT_N', 2 ** 14)
+app.config.setdefault('PASSWORD_SCRYPT_R', 8)
+app.config.setdefault('PASSWORD_SCRYPT_P', 1)
+app.config.setdefault('PASSWORD_PBKDF2_ITERATIONS', 390000)
+# Hashes computed at once; a login burst queues here instead of taking every CPU
+app.config.setdefault('PASSWORD_HASH_THREADS', 4)
+# Longest a request waits for a hashing slot before giving up
+app.config.setdefault('PASSWORD_HASH_WAIT_SECONDS', 10)
+
+
+class PasswordHashingBusy(Exception):
+    """Every password hashing slot stayed taken for PASSWORD_HASH_WAIT_SECONDS"""
+
+
+class ScryptHasher:
+    """scrypt$<n>$<r>$<p>$<salt>$<hash>"""
+    algorithm = 'scrypt'
+
+    def __init__(self, config):
+        self.params = (config['PASSWORD_SCRYPT_N'], config['PASSWORD_SCRYPT_R'], config['PASSWORD_SCRYPT_P'])
+
+    @staticmethod
+    def derive(password, salt, n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+    def encode(self, password):
+        salt = os.urandom(16)
+        digest = self.derive(password, salt, *self.params)
+        return '$'.join([self.algorithm, *map(str, self.params), encode_b64(salt), encode_b64(digest)])
+
+    def verify(self, password, encoded):
+        _, n, r, p, salt, digest = encoded.split('$')
+        return hmac.compare_digest(self.derive(password, decode_b64(salt), int(n), int(r), int(p)), decode_b64(digest))
+
+    def needs_rehash(self, encoded):
+        return tuple(int(part) for part in encoded.split('$')[1:4]) != self.params
+
+
+class Pbkdf2Hasher:
+    """pbkdf2_sha256$<iterations>$<salt>$<hash>"""
+    algorithm = 'pbkdf2_sha256'
+
+    def __init__(self, config):
+        self.iterations = config['PASSWORD_PBKDF2_ITERATIONS']
+
+    def encode(self, password):
+        salt = os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, self.iterations)
+        return '$'.join([self.algorithm, str(self.iterations), encode_b64(salt), encode_b64(digest)])
+
+    def verify(self, password, encoded):
+        _, iterations, salt, digest = encoded.split('$')
+        derived = hashlib.pbkdf2_hmac('sha256', password.encode(), decode_b64(salt), int(iterations))
+        return hmac.compare_digest(derived, decode_b64(digest))
+
+    def needs_rehash(self, encoded):
+        return int(encoded.split('$')[1]) != self.iterations
+
+
+PASSWORD_HASHERS = {hasher.algorithm: hasher for hasher in (ScryptHasher, Pbkdf2Hasher)}
+
+
+def encode_b64(raw):
+    return base64.b64encode(raw).decode()
+
+
+def decode_b64(text):
+    return base64.b64decode(text)
+
+
+def current_password_hasher():
+    """The hasher new passwords are stored with, at the currently configured cost"""
+    name = app.config['PASSWORD_HASHER']
+    if name == 'scrypt' and not hasattr(hashlib, 'scrypt'):
+        name = 'pbkdf2_sha256'
+    return PASSWORD_HASHERS[name](app.config)
+
+
+def _check_legacy_password(password, stored):
+    # Legacy row from before hashing: the column holds the password itself
+    return hmac.compare_digest((stored or '').encode(), password.encode()), True
+
+
+def _check_password(password, stored):
+    hasher = current_password_hasher()
+    algorithm = stored.split('$', 1)[0] if stored else ''
+    if algorithm not in PASSWORD_HASHERS:
+        return _check_legacy_password(password, stored)
+
+    try:
+        if not PASSWORD_HASHERS[algorithm](app.config).verify(password, stored):
+            return False, False
+    except (ValueError, TypeError):
+        # Looks like a hash but doesn't parse: a legacy password that happens to start with 'scrypt$'
+        return _check_legacy_password(password, stored)
+    return True, algorithm != hasher.algorithm or hasher.needs_rehash(stored)
+
+
+_password_executor = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_THREADS'],
+                                        thread_name_prefix='password-hash')
+# Requests allowed to wait on the pool at once, so a burst can't pile up unbounded
+_password_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_THREADS'] * 8)
+
+
+def run_password_job(func, *args):
+    """Run func on the bounded hashing pool and wait for its result"""
+    if not _password_slots.acquire(timeout=app.config['PASSWORD_HASH_WAIT_SECONDS']):
+        raise PasswordHashingBusy()
+    try:
+        return _password_executor.submit(func, *args).result()
+    finally:
+        _password_slots.release()
+
+
+def hash_password(password):
+    """Hash a new password with the configured hasher"""
+    return run_password_job(lambda: current_password_hasher().encode(password))
+
+
+def check_password(password, stored):
+    """(matches, needs_rehash) for a password against a stored hash or legacy plaintext"""
+    return run_password_job(_check_password, password, stored)
+
+
+# Compared against when no account matches, so a wrong username costs as long as a wrong password.
+# Built at startup (see STARTUP) so the first unknown-user login isn't slower than the rest.
+_dummy_password_hash = None
+
+
+def prepare_dummy_password_hash():
+    global _dummy_password_hash
+    _dummy_password_hash = current_password_hasher().encode(os.urandom(16).hex())
+
+
+def check_unknown_user_password(password):
+    if _dummy_password_hash is None:
+        prepare_dummy_password_hash()
+    check_password(password, _dummy_password_hash)
+
+
+# =====================
+# CURRENT USER
+# =====================
+
+# Seconds a user's admin role is trusted without asking SQLite.
+# Changes made through this process invalidate them at once; the TTL bounds how
+# long another worker process can act on a stale role.
+app.config.setdefault('USER_ACCESS_CACHE_TTL', 30)
+app.config.setdefault('USER_ACCESS_CACHE_SIZE', 4096)
+
+user_access_cache = FragmentCache(app.config['USER_ACCESS_CACHE_SIZE'], app.config['USER_ACCESS_CACHE_TTL'])
+
+
+def load_user_access(user_id, conn=None):
+    """{'is_admin'} for a user, from the cache or one query"""
+    access = user_access_cache.get(user_id)
+    if access is None:
+        admin = (conn or get_db()).execute(
+            "SELECT 1 FROM admin_table WHERE user_id = ? AND is_active = 1", (user_id,)
+        ).fetchone()
+        access = {'is_admin': admin is not None}
+        user_access_cache.set(user_id, access)
+    return access
+
+
+def invalidate_user_access(user_id):
+    """Forget a user's cached role after changing it"""
+    user_access_cache.discard(int(user_id))
+
+
+def current_user():
+    """The logged-in user for this request, loaded once per request; None when logged out"""
+    if 'current_user' not in g:
+        user = None
+        if 'user_id' in session:
+            access = load_user_access(session['user_id'])
+            user = {
+                'id': session['user_id'],
+                'username': session.get('username'),
+                'full_name': session.get('full_name'),
+                'is_banned': ban_registry.is_banned(session['user_id']),
+                **access,
+            }
+            # Keep the nav in step when the role changed since login
+            if session.get('is_admin') != access['is_admin']:
+                session['is_admin'] = access['is_admin']
+        g.current_user = user
+    return g.current_user
+
+
+def is_admin_user():
+    """Check if current user is admin using admin_table"""
+    user = current_user()
+    return user is not None and user['is_admin']
+
+
+# =====================
+# USER BANS
+# =====================
+
+# How often timed bans are expired and the ban list reloaded. Bans made in this
+# process apply at once; the reload picks up bans made by other worker processes.
+app.config.setdefault('BAN_SWEEP_SECONDS', 60)
+# Served without a ban check
+BAN_EXEMPT_ENDPOINTS = {'static', 'media_file', 'logout'}
+
+
+class BanRegistry:
+    """Active bans kept in memory: user id -> banned_until, None for permanent"""
+
+    def __init__(self):
+        self._bans = {}
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        """Replace the registry with (user_id, banned_until) rows"""
+        bans = {}
+        for user_id, banned_until in rows:
+            bans[user_id] = datetime.fromisoformat(banned_until) if banned_until else None
+        with self._lock:
+            self._bans = bans
+
+    def ban(self, user_id, banned_until=None):
+        with self._lock:
+            current = self._bans.get(user_id, banned_until)
+            # A longer ban already in place wins
+            if current is None or banned_until is None:
+                self._bans[user_id] = None
+            else:
+                self._bans[user_id] = max(current, banned_until)
+
+    def lift(self, user_id):
+        with self._lock:
+            self._bans.pop(user_id, None)
+
+    def is_banned(self, user_id):
+        banned_until = self._bans.get(user_id, False)
+        if banned_until is False:
+            return False
+        return banned_until is None or banned_until > datetime.now()
+
+    def banned_until(self, user_id):
+        return self._bans.get(user_id)
+
+    def __len__(self):
+        return len(self._bans)
+
+
+ban_registry = BanRegistry()
+
+
+def load_ban_registry(conn):
+    """Rebuild ban_registry from the active rows of user_bans"""
+    rows = conn.execute("""
+        SELECT user_id,
+               CASE WHEN MAX(is_permanent = 1 OR banned_until IS NULL) THEN NULL
+                    ELSE MAX(banned_until) END
+        FROM user_bans
+        WHERE is_active = 1
+        GROUP BY user_id
+    """).fetchall()
+    ban_registry.load(rows)
+
+
+def sweep_expired_bans():
+    """Deactivate timed bans whose banned_until has passed and reload the registry"""
+    with sqlite3.connect(DB_NAME) as conn:
+        expired = conn.execute(
+            "UPDATE user_bans SET is_active = 0 WHERE is_active = 1 AND is_permanent = 0 AND banned_until <= ?",
+            (datetime.now().isoformat(' '),)
+        ).rowcount
+        load_ban_registry(conn)
+    if expired:
+        print(f"ℹ️ Expired {expired} timed ban(s)")
+
+
+def ban_message(user_id):
+    banned_until = ban_registry.banned_until(user_id)
+    if banned_until is None:
+        return 'Your account has been suspended.'
+    return f"Your account is suspended until {banned_until.strftime('%B %d, %Y %I:%M %p')}."
+
+
+@app.before_request
+def enforce_bans():
+    """Log a banned user out on their next request; checked against ban_registry, no query"""
+    user_id = session.get('user_id')
+    if user_id is None or request.endpoint in BAN_EXEMPT_ENDPOINTS or not ban_registry.is_banned(user_id):
+        return None
+
+    message = ban_message(user_id)
+    session.clear()
+    if request.path.startswith('/api/') or request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'error', 'message': message}), 403
+    flash(message, 'error')
+    return redirect(url_for('login'))
+
+
 # =====================
 # ROUTES
 # =====================
@@ -478,7 +1538,7 @@ def register():
         full_name = request.form.get('full_name', '')
         contact = request.form.get('contact', '')
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             try:
                 # Check if username or email already exists
                 existing_user = conn.execute(
@@ -492,7 +1552,7 @@ def register():
 
                 conn.execute(
                     "INSERT INTO users (username, email, password, birthdate, location, full_name, contact) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (username, email, password, birthdate, location, full_name, contact))
+                    (username, email, hash_password(password), birthdate, location, full_name, contact))
                 flash('Registration successful! You can now login.', 'success')
                 return redirect(url_for('login'))
             except sqlite3.IntegrityError:
@@ -507,26 +1567,44 @@ def login():
         username_or_email = request.form['username']
         password = request.form['password']
 
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
-            # Check if login is username OR email
-            user = conn.execute("""
+        with get_db() as conn:
+            # Check if login is username OR email; the password is checked off the hashing pool
+            candidates = conn.execute("""
                 SELECT * FROM users 
-                WHERE (username = ? OR email = ?) AND password = ?
-            """, (username_or_email, username_or_email, password)).fetchone()
+                WHERE username = ? OR email = ?
+            """, (username_or_email, username_or_email)).fetchall()
+
+            user = None
+            try:
+                for candidate in candidates:
+                    matches, needs_rehash = check_password(password, candidate['password'])
+                    if matches:
+                        user = candidate
+                        break
+                if not candidates:
+                    check_unknown_user_password(password)
+
+                if user and needs_rehash:
+                    # Legacy plaintext or an older cost: upgrade while we have the password
+                    conn.execute(
+                        "UPDATE users SET password = ? WHERE id = ? AND password = ?",
+                        (hash_password(password), user['id'], user['password'])
+                    )
+            except PasswordHashingBusy:
+                flash('The server is busy, please try logging in again in a moment.', 'error')
+                return render_template('login.html'), 503
+
+            if user and ban_registry.is_banned(user['id']):
+                flash(ban_message(user['id']), 'error')
+                return render_template('login.html'), 403
 
             if user:
                 session['user_id'] = user['id']
                 session['username'] = user['username']
                 session['full_name'] = user['full_name'] or user['username']
 
-                # Check if user is admin using admin_table
-                admin = conn.execute(
-                    "SELECT * FROM admin_table WHERE user_id = ? AND is_active = 1",
-                    (user['id'],)
-                ).fetchone()
-
-                session['is_admin'] = admin is not None
+                # Check if user is admin using admin_table (cached for later requests)
+                session['is_admin'] = load_user_access(user['id'], conn)['is_admin']
 
                 flash('Login successful!', 'success')
                 return redirect(url_for('dashboard'))
@@ -542,20 +1620,6 @@ def logout():
     return redirect(url_for('index'))
 
 
-# Add this function to check if user is admin
-def is_admin_user():
-    """Check if current user is admin"""
-    if 'user_id' not in session:
-        return False
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        user = conn.execute(
-            "SELECT is_admin FROM users WHERE id = ?",
-            (session['user_id'],)
-        ).fetchone()
-        return user and user['is_admin']
-
-
 @app.route('/dashboard')
 def dashboard():
     """User dashboard - works for both traders and admin"""
@@ -567,36 +1631,25 @@ def dashboard():
 
     # For ADMIN: Show admin-specific content but same design
     if is_admin_user():
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_db() as conn:
 
             # Get platform stats for admin
-            total_users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
-            total_items = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
-            active_trades = \
-            conn.execute("SELECT COUNT(*) FROM trades WHERE trade_status IN ('pending', 'accepted')").fetchone()[0]
-            completed_trades = conn.execute("SELECT COUNT(*) FROM trades WHERE trade_status = 'completed'").fetchone()[
-                0]
+            stats = get_platform_stats(conn)
 
         return render_template('dashboard.html',
                                is_admin=True,
-                               total_users=total_users,
-                               total_items=total_items,
-                               active_trades=active_trades,
-                               completed_trades=completed_trades)
+                               total_users=stats['total_users'],
+                               total_items=stats['total_items'],
+                               active_trades=stats['active_trades'],
+                               completed_trades=stats['completed_trades'])
 
     # For TRADERS: Show normal trader dashboard
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         items = conn.execute("""
             SELECT i.*, 
                    CASE 
                        WHEN i.item_available = 0 THEN 'traded'
-                       WHEN EXISTS (
-                           SELECT 1 FROM trades 
-                           WHERE (offer_item_id = i.items_id OR target_item_id = i.items_id)
-                           AND trade_status IN ('pending', 'accepted')
-                       ) THEN 'in_trade'
+                       WHEN i.locked_by_trade_id IS NOT NULL THEN 'in_trade'
                        ELSE 'available'
                    END as item_status
             FROM items i 
@@ -612,71 +1665,119 @@ def admin_dashboard():
         flash('Access denied. Admin only.', 'error')
         return redirect(url_for('dashboard'))
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         # Get stats
-        total_users = conn.execute("SELECT COUNT(*) FROM users WHERE is_admin = 0").fetchone()[0]
-        pending_reports = conn.execute("SELECT COUNT(*) FROM user_reports WHERE status = 'pending'").fetchone()[0]
-        pending_suggestions = \
-        conn.execute("SELECT COUNT(*) FROM user_recommendations WHERE status = 'pending'").fetchone()[0]
-        active_bans = conn.execute("SELECT COUNT(*) FROM user_bans WHERE is_active = 1").fetchone()[0]
-
-        # Get users with report counts
-        users = conn.execute("""
-                   SELECT u.*, 
-                          (SELECT COUNT(*) FROM user_reports WHERE reported_user_id = u.id) as report_count,
-                          (SELECT COUNT(*) FROM user_bans WHERE user_id = u.id AND is_active = 1) as is_banned
-                   FROM users u
-                   WHERE u.is_admin = 0
-                   ORDER BY u.id DESC
-               """).fetchall()
-
-        # Get reports
-        reports = conn.execute("""
-            SELECT ur.*, 
-                   ru.username as reported_username, ru.email as reported_email,
-                   rr.username as reporter_username, rr.email as reporter_email
-            FROM user_reports ur
-            JOIN users ru ON ur.reported_user_id = ru.id
-            JOIN users rr ON ur.reporting_user_id = rr.id
-            ORDER BY ur.created_at DESC
-        """).fetchall()
-
-        # Get suggestions
-        suggestions = conn.execute("""
-            SELECT ur.*, u.username, u.email
-            FROM user_recommendations ur
-            JOIN users u ON ur.user_id = u.id
-            ORDER BY ur.created_at DESC
-        """).fetchall()
-
-        # Get announcements
-        announcements = conn.execute("""
-            SELECT a.*, u.username as admin_username
-            FROM announcements a
-            JOIN users u ON a.admin_id = u.id
-            ORDER BY a.created_at DESC
-        """).fetchall()
-
-        # Get bans
-        bans = conn.execute("""
-            SELECT ub.*, u.username, u.email, admin_u.username as admin_username
-            FROM user_bans ub
-            JOIN users u ON ub.user_id = u.id
-            JOIN users admin_u ON ub.admin_id = admin_u.id
-            ORDER BY ub.created_at DESC
-        """).fetchall()
+        stats = get_platform_stats(conn)
+        total_users = stats['total_traders']
+        pending_reports = stats['pending_reports']
+        pending_suggestions = stats['pending_suggestions']
+        active_bans = stats['active_bans']
 
+    # Each tab's rows are fetched on demand from /admin/api/<section>
     return render_template('admin.html',
                            total_users=total_users,
                            pending_reports=pending_reports,
                            pending_suggestions=pending_suggestions,
-                           active_bans=active_bans,
-                           users=users,
-                           reports=reports,
-                           suggestions=suggestions,
-                           announcements=announcements,
-                           bans=bans)
+                           active_bans=active_bans)
+
+
+# Admin console tabs: base query, columns ?q= searches, column ?status= filters.
+# Every query selects a unique "id" used as the (descending) keyset sort key.
+ADMIN_SECTIONS = {
+    'users': ("""
+        SELECT u.* FROM users u
+        WHERE u.is_admin = 0
+    """, ('u.username', 'u.email', 'u.full_name'), None),
+    'reports': ("""
+        SELECT ur.*, 
+               ru.username as reported_username, ru.email as reported_email,
+               rr.username as reporter_username, rr.email as reporter_email
+        FROM user_reports ur
+        JOIN users ru ON ur.reported_user_id = ru.id
+        JOIN users rr ON ur.reporting_user_id = rr.id
+        WHERE 1 = 1
+    """, ('ru.username', 'rr.username', 'ur.reason', 'ur.description'), 'ur.status'),
+    'suggestions': ("""
+        SELECT ur.*, u.username, u.email
+        FROM user_recommendations ur
+        JOIN users u ON ur.user_id = u.id
+        WHERE 1 = 1
+    """, ('u.username', 'ur.title', 'ur.description'), 'ur.status'),
+    'announcements': ("""
+        SELECT a.*, u.username as admin_username
+        FROM announcements a
+        JOIN users u ON a.admin_id = u.id
+        WHERE 1 = 1
+    """, ('a.title', 'a.content'), None),
+    'bans': ("""
+        SELECT ub.*, u.username, u.email, admin_u.username as admin_username
+        FROM user_bans ub
+        JOIN users u ON ub.user_id = u.id
+        JOIN users admin_u ON ub.admin_id = admin_u.id
+        WHERE 1 = 1
+    """, ('u.username', 'u.email', 'ub.reason'), None),
+}
+
+
+@app.route('/admin/api/<section>')
+def admin_section(section):
+    """One page of an admin console tab, filtered by ?q= and ?status="""
+    if not is_admin_user():
+        return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+    if section not in ADMIN_SECTIONS:
+        return jsonify({'status': 'error', 'message': 'Unknown section'}), 404
+
+    sql, search_columns, status_column = ADMIN_SECTIONS[section]
+    params = []
+
+    query = request.args.get('q', '').strip()
+    if query:
+        sql += " AND (" + " OR ".join(f"{column} LIKE ?" for column in search_columns) + ")"
+        params.extend([f"%{query}%"] * len(search_columns))
+
+    status = request.args.get('status', '').strip()
+    if status and status_column:
+        sql += f" AND {status_column} = ?"
+        params.append(status)
+
+    with get_db() as conn:
+        rows, next_cursor, prev_cursor = fetch_keyset_page(
+            conn, sql, params, ('id',), request.args.get('cursor'), get_page_size(), descending=True
+        )
+        rows = [dict(row) for row in rows]
+
+        if section == 'users':
+            # Report and ban counts for just this page, as two grouped lookups
+            for row in rows:
+                row.pop('password', None)
+            user_ids = [row['id'] for row in rows]
+            placeholders = ', '.join('?' for _ in user_ids)
+            report_counts, ban_counts = {}, {}
+            if user_ids:
+                report_counts = dict(conn.execute(f"""
+                    SELECT reported_user_id, COUNT(*) FROM user_reports
+                    WHERE reported_user_id IN ({placeholders})
+                    GROUP BY reported_user_id
+                """, user_ids).fetchall())
+                ban_counts = dict(conn.execute(f"""
+                    SELECT user_id, COUNT(*) FROM user_bans
+                    WHERE user_id IN ({placeholders}) AND is_active = 1
+                    GROUP BY user_id
+                """, user_ids).fetchall())
+            for row in rows:
+                row['report_count'] = report_counts.get(row['id'], 0)
+                row['is_banned'] = ban_counts.get(row['id'], 0)
+
+    return jsonify({'rows': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor})
+
+
+@app.route('/admin/cache_stats')
+def admin_cache_stats():
+    """Hit/miss/eviction counters of the search result cache, with the fragment and search ranking caches' nested"""
+    if not is_admin_user():
+        return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+    return jsonify({**search_cache.stats(), 'fragments': fragment_cache.stats(),
+                    'search_ranks': search_rank_cache.stats()})
 
 
 @app.route('/add_item', methods=['GET', 'POST'])
@@ -691,6 +1792,12 @@ def add_item():
         return redirect(url_for('dashboard'))
 
     if request.method == 'POST':
+        try:
+            item_image = item_image_from_form()  # Uploaded file or image URL
+        except ImageUploadError as e:
+            flash(f'{e}.', 'error')
+            return redirect(url_for('add_item'))
+
         data = (
             session['user_id'],
             request.form['item_Name'],
@@ -699,10 +1806,10 @@ def add_item():
             request.form['item_DateBought'],  # Date bought (user input)
             request.form['item_DateOffered'],  # When offered (auto-generated)
             request.form['item_Description'],
-            request.form.get('item_image', '')  # Image URL
+            item_image
         )
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             conn.execute("""
                 INSERT INTO items (user_id, item_Name, item_Brand, item_Condition, item_DateBought, item_DateOffered, item_Description, item_image)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -720,14 +1827,19 @@ def edit_item(id):
         flash('Please login first.', 'warning')
         return redirect(url_for('login'))
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         item = conn.execute("SELECT * FROM items WHERE items_id=? AND user_id=?", (id, session['user_id'])).fetchone()
         if not item:
             flash('Item not found.', 'error')
             return redirect(url_for('dashboard'))
 
     if request.method == 'POST':
+        try:
+            item_image = item_image_from_form(item['item_image'])  # Uploaded file or image URL
+        except ImageUploadError as e:
+            flash(f'{e}.', 'error')
+            return redirect(url_for('edit_item', id=id))
+
         data = (
             request.form['item_Name'],
             request.form['item_Brand'],
@@ -735,12 +1847,12 @@ def edit_item(id):
             request.form['item_DateBought'],  # Date bought
             request.form['item_DateOffered'],  # When offered
             request.form['item_Description'],
-            request.form.get('item_image', ''),  # Image URL
+            item_image,
             id,
             session['user_id']
         )
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             conn.execute("""
                 UPDATE items
                 SET item_Name=?, item_Brand=?, item_Condition=?, item_DateBought=?, item_DateOffered=?, item_Description=?, item_image=?
@@ -759,43 +1871,349 @@ def delete_item(id):
         flash('Please login first.', 'warning')
         return redirect(url_for('login'))
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("DELETE FROM items WHERE items_id=? AND user_id=?", (id, session['user_id']))
 
     flash('Item deleted successfully!', 'info')
     return redirect(url_for('dashboard'))
 
 
-@app.route('/search_items')
-def search_items():
-    """Search items - EXCLUDE ADMIN ITEMS"""
-    query = request.args.get('q', '')
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+# Snippet markers; swapped for <mark> tags after the snippet text is escaped
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
 
-        # EXCLUDE items from admin users
-        items = conn.execute("""
-            SELECT i.*, u.username, u.full_name, u.location, u.contact
-            FROM items i
+
+def build_fts_query(text):
+    """Turn free text into an FTS5 query that prefix-matches every word"""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+# Item listings are paged by keyset (WHERE sort_key > last seen) rather than
+# OFFSET, so page 50 costs the same as page 1
+ITEMS_PAGE_SIZE = 24
+MAX_ITEMS_PAGE_SIZE = 100
+
+
+def get_page_size(default=ITEMS_PAGE_SIZE):
+    """Read the requested page size from ?limit=, clamped to a sane range"""
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, MAX_ITEMS_PAGE_SIZE))
+
+
+def encode_cursor(direction, key):
+    """Pack a page direction and sort key into an opaque URL-safe token"""
+    raw = json.dumps([direction, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, key_length):
+    """Unpack a cursor token; anything malformed just means the first page"""
+    if not token:
+        return 'next', None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, key = json.loads(raw)
+    except (ValueError, TypeError):
+        return 'next', None
+    if direction not in ('next', 'prev') or not isinstance(key, list) or len(key) != key_length:
+        return 'next', None
+    return direction, key
+
+
+def fetch_keyset_page(conn, sql, params, sort_keys, cursor=None, limit=ITEMS_PAGE_SIZE, descending=False):
+    """Fetch one page of a listing query ordered by sort_keys.
+
+    sql must not have an ORDER BY and must select every column in sort_keys,
+    which together have to be unique and non-NULL. Returns
+    (rows, next_cursor, prev_cursor); a cursor is None when there is no such page.
+    """
+    direction, key = decode_cursor(cursor, len(sort_keys))
+    backwards = direction == 'prev'
+    ascending = descending == backwards
+    columns = ', '.join(sort_keys)
+    args = list(params)
+
+    where = ''
+    if key is not None:
+        placeholders = ', '.join('?' for _ in sort_keys)
+        where = f"WHERE ({columns}) {'>' if ascending else '<'} ({placeholders})"
+        args.extend(key)
+
+    order = ', '.join(f"{column} {'ASC' if ascending else 'DESC'}" for column in sort_keys)
+    rows = conn.execute(
+        f"SELECT * FROM ({sql}) {where} ORDER BY {order} LIMIT ?",
+        args + [limit + 1]
+    ).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+
+    first_key = [rows[0][column] for column in sort_keys]
+    last_key = [rows[-1][column] for column in sort_keys]
+    has_next = has_more if not backwards else True
+    has_prev = key is not None if not backwards else has_more
+    next_cursor = encode_cursor('next', last_key) if has_next else None
+    prev_cursor = encode_cursor('prev', first_key) if has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+# bm25() is only known once every match has been scored, so a keyset cursor on it
+# can't skip the sort. Instead each query is ranked once per catalogue version
+# into a list of (relevance, items_id), and its pages are slices of that list.
+app.config.setdefault('SEARCH_RANK_CACHE_SIZE', 256)
+app.config.setdefault('SEARCH_RANK_CACHE_TTL', 300)
+
+search_rank_cache = FragmentCache(app.config['SEARCH_RANK_CACHE_SIZE'], app.config['SEARCH_RANK_CACHE_TTL'])
+
+
+def ranked_search_matches(conn, fts_query):
+    """Every visible match for an FTS query as sorted (relevance, items_id) pairs"""
+    key = (get_catalogue_version(conn)[0], fts_query)
+    ranked = search_rank_cache.get(key)
+    if ranked is None:
+        # bm25 weights: item name, brand, description, owner username, owner full name
+        ranked = [tuple(row) for row in conn.execute("""
+            SELECT bm25(items_fts, 10.0, 5.0, 1.0, 3.0, 3.0) as relevance, i.items_id
+            FROM items_fts
+            JOIN items i ON i.items_id = items_fts.rowid
             JOIN users u ON i.user_id = u.id
-            WHERE (i.item_Name LIKE ? OR i.item_Brand LIKE ? OR i.item_Description LIKE ?
-            OR u.username LIKE ? OR u.full_name LIKE ?)
+            WHERE items_fts MATCH ?
             AND u.is_admin = 0  -- EXCLUDE ADMIN USERS
-            AND (i.item_available IS NULL OR i.item_available = 1)
-            AND i.items_id NOT IN (
-                -- Items in active trades
-                SELECT offer_item_id FROM trades WHERE trade_status IN ('pending', 'accepted')
-                UNION 
-                SELECT target_item_id FROM trades WHERE trade_status IN ('pending', 'accepted')
-                UNION
-                -- Items in completed trades
-                SELECT offer_item_id FROM trades WHERE trade_status = 'completed'
-                UNION 
-                SELECT target_item_id FROM trades WHERE trade_status = 'completed'
-            )
-        """, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%")).fetchall()
+            AND i.item_available = 1
+            AND i.locked_by_trade_id IS NULL  -- not held by a pending, accepted or completed trade
+            ORDER BY relevance, i.items_id
+        """, (fts_query,))]
+        search_rank_cache.set(key, ranked)
+    return ranked
+
+
+def page_ranked_matches(ranked, cursor=None, limit=ITEMS_PAGE_SIZE):
+    """Slice one page out of a sorted list of keys, with the same cursors fetch_keyset_page uses"""
+    direction, key = decode_cursor(cursor, 2)
+    try:
+        if key is None:
+            position = 0
+        elif direction == 'next':
+            position = bisect.bisect_right(ranked, tuple(key))
+        else:
+            position = bisect.bisect_left(ranked, tuple(key))
+    except TypeError:
+        # A tampered cursor whose key doesn't compare with ours: first page
+        direction, position = 'next', 0
+
+    if direction == 'next':
+        start, end = position, min(position + limit, len(ranked))
+    else:
+        start, end = max(position - limit, 0), position
+    page = ranked[start:end]
+    if not page:
+        return page, None, None
+
+    next_cursor = encode_cursor('next', list(page[-1])) if end < len(ranked) else None
+    prev_cursor = encode_cursor('prev', list(page[0])) if start > 0 else None
+    return page, next_cursor, prev_cursor
+
+
+def search_catalogue(conn, query, cursor=None, limit=ITEMS_PAGE_SIZE):
+    """Find tradeable, non-admin items matching the query, best matches first.
+
+    Returns (items, next_cursor, prev_cursor) for one page of results.
+    """
+    fts_query = build_fts_query(query) if FTS5_AVAILABLE else ''
+
+    if fts_query:
+        page, next_cursor, prev_cursor = page_ranked_matches(ranked_search_matches(conn, fts_query), cursor, limit)
+        if not page:
+            return [], None, None
+
+        # Only the page's rows are read, and only they get a snippet
+        rows = conn.execute(f"""
+            SELECT i.*, u.username, u.full_name, u.location, u.contact,
+                   snippet(items_fts, -1, ?, ?, '…', 12) as snippet
+            FROM items_fts
+            JOIN items i ON i.items_id = items_fts.rowid
+            JOIN users u ON i.user_id = u.id
+            WHERE items_fts MATCH ? AND items_fts.rowid IN ({', '.join('?' for _ in page)})
+        """, (SNIPPET_START, SNIPPET_END, fts_query, *(items_id for _, items_id in page))).fetchall()
+        by_id = {row['items_id']: row for row in rows}
+        items = [dict(by_id[items_id], relevance=relevance) for relevance, items_id in page if items_id in by_id]
+        return items, next_cursor, prev_cursor
+
+    # No FTS5, or nothing searchable in the query: plain substring match, newest first
+    return fetch_keyset_page(conn, """
+        SELECT i.*, u.username, u.full_name, u.location, u.contact, NULL as snippet
+        FROM items i
+        JOIN users u ON i.user_id = u.id
+        WHERE (i.item_Name LIKE ? OR i.item_Brand LIKE ? OR i.item_Description LIKE ?
+        OR u.username LIKE ? OR u.full_name LIKE ?)
+        AND u.is_admin = 0  -- EXCLUDE ADMIN USERS
+        AND i.item_available = 1
+        AND i.locked_by_trade_id IS NULL  -- not held by a pending, accepted or completed trade
+    """, (f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%", f"%{query}%"), ('items_id',), cursor, limit,
+        descending=True)
+
+
+def list_tradeable_items(conn, exclude_user_id=None, cursor=None, limit=ITEMS_PAGE_SIZE):
+    """Page through tradeable, non-admin items ordered by owner, optionally skipping one trader's own"""
+    return fetch_keyset_page(conn, """
+        SELECT i.*, u.username, u.full_name, u.location, u.contact
+        FROM items i
+        JOIN users u ON i.user_id = u.id
+        WHERE i.user_id != ? 
+        AND u.is_admin = 0  -- EXCLUDE ADMIN USERS
+        AND i.item_available = 1
+        AND i.locked_by_trade_id IS NULL
+    """, (exclude_user_id or 0,), ('username', 'items_id'), cursor, limit)
+
+
+@app.template_filter('highlight')
+def highlight_snippet(snippet):
+    """Render a search snippet with its matched terms wrapped in <mark>"""
+    if not snippet:
+        return ''
+    html = str(escape(snippet))
+    return Markup(html.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+
+class SearchCache:
+    """LRU cache with a TTL for rendered anonymous search pages.
+
+    Keys carry the catalogue version, so any catalogue write (item add/edit/
+    delete, trade locks and releases) makes older entries unreachable. When
+    redis_url is set and the redis package is installed, entries are also
+    shared with the other workers.
+    """
+
+    def __init__(self, max_entries=256, ttl=60, redis_url=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url)
+            except ImportError:
+                print("ℹ️ redis package not installed, search cache stays in-process")
+
+    def get(self, version, key):
+        """Return the cached page for key at this catalogue version, or None"""
+        with self._lock:
+            if version != self._version:
+                # The catalogue moved on; nothing held locally can be served any more
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._version = version
+
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+                self.evictions += 1
+
+        if self._redis is not None:
+            try:
+                shared = self._redis.get(f"barterzone:search:{version}:{key}")
+            except Exception:
+                shared = None
+            if shared is not None:
+                self._store(key, shared.decode())
+                with self._lock:
+                    self.hits += 1
+                return shared.decode()
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, version, key, page):
+        """Cache a rendered page for key at this catalogue version"""
+        if version != self._version:
+            return
+        self._store(key, page)
+        if self._redis is not None:
+            try:
+                self._redis.setex(f"barterzone:search:{version}:{key}", self.ttl, page)
+            except Exception:
+                pass
+
+    def _store(self, key, page):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, page)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Counters for the admin cache stats endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'catalogue_version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'shared_backend': 'redis' if self._redis is not None else None,
+            }
+
+
+app.config.setdefault('SEARCH_CACHE_SIZE', 256)
+app.config.setdefault('SEARCH_CACHE_TTL', 60)
+app.config.setdefault('SEARCH_CACHE_REDIS_URL', os.environ.get('BARTERZONE_SEARCH_CACHE_REDIS_URL'))
+
+search_cache = SearchCache(app.config['SEARCH_CACHE_SIZE'], app.config['SEARCH_CACHE_TTL'],
+                           app.config['SEARCH_CACHE_REDIS_URL'])
+
 
-    return render_template('search_results.html', items=items, query=query)
+@app.route('/search_items')
+def search_items():
+    """Search items - EXCLUDE ADMIN ITEMS"""
+    query = request.args.get('q', '')
+    cursor = request.args.get('cursor')
+    limit = get_page_size()
+
+    # Only visitors with nothing session-specific on the page share cached results
+    cacheable = 'user_id' not in session and '_flashes' not in session
+    with get_db() as conn:
+        if cacheable:
+            version, _ = get_catalogue_version(conn)
+            # The page echoes the query back, so only whitespace is normalized, not case
+            cache_key = json.dumps([' '.join(query.split()), cursor, limit])
+            page = search_cache.get(version, cache_key)
+            if page is not None:
+                return page
+
+        items, next_cursor, prev_cursor = search_catalogue(conn, query, cursor, limit)
+
+    page = render_template('search_results.html', items=items, query=query,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
+    if cacheable:
+        search_cache.set(version, cache_key, page)
+    return page
 
 @app.route('/other_traders_items')
 def other_traders_items():
@@ -805,26 +2223,76 @@ def other_traders_items():
         return redirect(url_for('login'))
 
     user_id = session['user_id']
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
-        # Get only available items from other traders (excluding admin)
-        items = conn.execute("""
-            SELECT i.*, u.username, u.full_name, u.location, u.contact
-            FROM items i
-            JOIN users u ON i.user_id = u.id
-            WHERE i.user_id != ? 
-            AND u.is_admin = 0  -- EXCLUDE ADMIN USERS
-            AND i.item_available = 1
-            AND i.items_id NOT IN (
-                SELECT offer_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                UNION 
-                SELECT target_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-            )
-            ORDER BY u.username ASC
-        """, (user_id,)).fetchall()
+        # Get only available items from other traders (excluding admin), a page at a time
+        items, next_cursor, prev_cursor = list_tradeable_items(
+            conn, user_id, request.args.get('cursor'), get_page_size()
+        )
+
+    return render_template('TraderOption.html', items=items, mode='other_traders',
+                           next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+# =====================
+# JSON API
+# =====================
+
+# Fields the item API may return; ?fields= picks a subset
+ITEM_API_FIELDS = (
+    'items_id', 'user_id', 'item_Name', 'item_Brand', 'item_Condition', 'item_DateBought',
+    'item_DateOffered', 'item_Description', 'item_image', 'username', 'full_name', 'location', 'contact',
+)
+
+
+def get_catalogue_version(conn):
+    """Return (version, updated_at) of the item catalogue"""
+    state = conn.execute("SELECT version, updated_at FROM catalogue_state WHERE id = 1").fetchone()
+    return (state['version'], state['updated_at']) if state else (0, None)
+
+
+@app.route('/api/items')
+def api_items():
+    """Read-only JSON listing of tradeable items, with ?q= search, paging and field selection"""
+    fields = [f for f in request.args.get('fields', '').split(',') if f in ITEM_API_FIELDS] or list(ITEM_API_FIELDS)
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
+    limit = get_page_size()
+    viewer_id = session.get('user_id')
+
+    with get_db() as conn:
+        version, updated_at = get_catalogue_version(conn)
+
+        # Same catalogue version + same request = same body, so answer from the client's copy
+        variant = json.dumps([query, cursor, limit, fields, viewer_id])
+        etag = f"{version}-{hashlib.sha1(variant.encode()).hexdigest()[:16]}"
+        last_modified = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S') if updated_at else None
+
+        # Only the version ETag decides a 304: updated_at has one-second resolution, so
+        # If-Modified-Since would miss a write made in the same second as the last fetch.
+        # Weak match, since compress_response hands out W/"..." for the gzipped body.
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            if query:
+                items, next_cursor, prev_cursor = search_catalogue(conn, query, cursor, limit)
+            else:
+                items, next_cursor, prev_cursor = list_tradeable_items(conn, viewer_id, cursor, limit)
+
+            response = jsonify({
+                'items': [{field: item[field] for field in fields} for item in items],
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'catalogue_version': version,
+            })
+
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.cache_control.private = viewer_id is not None
+    response.cache_control.public = viewer_id is None
+    return response
 
-    return render_template('TraderOption.html', items=items, mode='other_traders')
 
 @app.route('/debug_items')
 def debug_items():
@@ -832,8 +2300,7 @@ def debug_items():
     if 'user_id' not in session:
         return "Please login first"
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         items = conn.execute("SELECT * FROM items").fetchall()
 
         result = "<h1>Items Debug</h1>"
@@ -850,25 +2317,203 @@ def debug_items():
 
 def is_item_available_for_trade(item_id):
     """Check if an item is available for trading"""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
-        # Check if item exists and is available
+    with get_db() as conn:
         item = conn.execute("""
-            SELECT item_available FROM items WHERE items_id = ?
+            SELECT item_available, locked_by_trade_id FROM items WHERE items_id = ?
         """, (item_id,)).fetchone()
 
-        if not item or item['item_available'] == 0:
-            return False
+        return bool(item) and item['item_available'] != 0 and item['locked_by_trade_id'] is None
+
+
+def lock_trade_items(conn, trade_id, offer_item_id, target_item_id):
+    """Reserve both items of a new trade for it; returns how many were still free to reserve"""
+    return conn.execute("""
+        UPDATE items SET locked_by_trade_id = ?
+        WHERE items_id IN (?, ?) AND item_available = 1 AND locked_by_trade_id IS NULL
+    """, (trade_id, offer_item_id, target_item_id)).rowcount
+
+
+def release_trade_items(conn, trade_id):
+    """Put the items of a declined or cancelled trade back on the market"""
+    conn.execute(
+        "UPDATE items SET locked_by_trade_id = NULL WHERE locked_by_trade_id = ?",
+        (trade_id,)
+    )
+
+
+def mark_trade_items_traded(conn, trade_id):
+    """Take the items of a completed trade off the market for good"""
+    conn.execute("""
+        UPDATE items SET item_available = 0, locked_by_trade_id = ?
+        WHERE items_id IN (
+            SELECT offer_item_id FROM trades WHERE trade_id = ?
+            UNION ALL
+            SELECT target_item_id FROM trades WHERE trade_id = ?
+        )
+    """, (trade_id, trade_id, trade_id))
 
-        # Check if item is involved in any active trades
-        active_trade = conn.execute("""
-            SELECT trade_id FROM trades 
-            WHERE (offer_item_id = ? OR target_item_id = ?)
-            AND trade_status IN ('pending', 'accepted')
-        """, (item_id, item_id)).fetchone()
+# =====================
+# TRADE STATE MACHINE
+# =====================
+# Every change to a trade's status goes through here. A transition takes the
+# write lock up front (BEGIN IMMEDIATE), checks the action is allowed from the
+# trade's current status, then applies one conditional
+# UPDATE ... WHERE trade_status = ? AND version = ?. Of two racing clicks only
+# one can match, and a client acting on a stale page (older version) gets a
+# TradeConflict instead of overwriting newer state.
+
+# action: (statuses it may start from, status it leads to, who may take it)
+TRADE_TRANSITIONS = {
+    'accept': (('pending',), 'accepted', 'target'),
+    'decline': (('pending',), 'declined', 'target'),
+    'withdraw': (('pending',), 'cancelled', 'offer'),
+    'cancel': (('pending', 'accepted'), 'cancelled', 'either'),
+    # The arrangement steps only exist once the target has accepted the offer
+    'confirm_details': (('accepted',), 'accepted', 'either'),
+    'confirm_receipt': (('accepted',), 'completed', 'either'),
+    'complete': (('accepted',), 'completed', 'either'),
+}
+
+
+class TradeConflict(Exception):
+    """A trade action that is not allowed now, or that lost a race with another one.
+
+    Raise it out of the `with get_db() as conn:` block so the transition's
+    partial writes are rolled back.
+    """
+
+
+def begin_immediate(conn):
+    """Take SQLite's write lock now instead of at the first write"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def requested_trade_version():
+    """The trade version the client last saw (form field or JSON "version"), if it sent one"""
+    data = request.get_json(silent=True) or request.form
+    try:
+        return int(data.get('version'))
+    except (TypeError, ValueError):
+        return None
+
+
+def check_trade_action(conn, trade_id, user_id, action, expected_version=None):
+    """Lock the database and return the trade if user_id may take action on it now"""
+    from_statuses, _, actor = TRADE_TRANSITIONS[action]
+    begin_immediate(conn)
+
+    trade = conn.execute(
+        "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
+        (trade_id, user_id, user_id)
+    ).fetchone()
+
+    if not trade:
+        raise TradeConflict('Trade not found.')
+    if (actor == 'offer' and trade['offer_user_id'] != user_id) or \
+            (actor == 'target' and trade['target_user_id'] != user_id):
+        raise TradeConflict('You cannot perform this action on this trade.')
+    if trade['trade_status'] not in from_statuses:
+        raise TradeConflict(f"This trade is already {trade['trade_status']}.")
+    if expected_version is not None and expected_version != trade['version']:
+        raise TradeConflict('This trade was updated by the other trader. Please refresh and try again.')
+    return trade
+
+
+def update_trade_state(conn, trade, to_status, **changes):
+    """Conditionally write the trade's next state; returns the new trades row"""
+    assignments = ''.join(f", {column} = ?" for column in changes)
+    rows = conn.execute(f"""
+        UPDATE trades SET trade_status = ?, version = version + 1{assignments}
+        WHERE trade_id = ? AND trade_status = ? AND version = ?
+        RETURNING *
+    """, (to_status, *changes.values(), trade['trade_id'], trade['trade_status'], trade['version'])).fetchall()
+
+    if not rows:
+        raise TradeConflict('This trade was updated by the other trader. Please refresh and try again.')
+
+    if to_status != trade['trade_status']:
+        if to_status in ('declined', 'cancelled'):
+            release_trade_items(conn, trade['trade_id'])
+        elif to_status == 'completed':
+            mark_trade_items_traded(conn, trade['trade_id'])
+            record_completed_trade(conn, trade)
+        conn.execute("UPDATE trade_arrangements SET status = ? WHERE trade_id = ?", (to_status, trade['trade_id']))
+
+    publish_trade_status(conn, trade['trade_id'])
+    return rows[0]
+
+
+def create_trade_request(conn, user_id, offer_item_id, target_item_id):
+    """Open a pending trade and reserve both items in one write transaction.
+
+    The reservation is a conditional UPDATE on the items' lock, so when two
+    requests race for the same item exactly one gets it; the other raises
+    TradeConflict and its trade row is rolled back with it.
+    """
+    begin_immediate(conn)
+    cursor = conn.execute("""
+        INSERT INTO trades (offer_user_id, target_user_id, offer_item_id, target_item_id)
+        SELECT offer.user_id, target.user_id, offer.items_id, target.items_id
+        FROM items offer, items target
+        WHERE offer.items_id = ? AND offer.user_id = ?
+        AND target.items_id = ? AND target.user_id != ?
+    """, (offer_item_id, user_id, target_item_id, user_id))
+    trade_id = cursor.lastrowid
+
+    if cursor.rowcount != 1:
+        raise TradeConflict('Target item not found or unavailable for trading.')
+    if lock_trade_items(conn, trade_id, offer_item_id, target_item_id) != 2:
+        raise TradeConflict('One of these items was just reserved for another trade. Please choose again.')
+
+    publish_trade_status(conn, trade_id)
+    return trade_id
+
+
+def apply_trade_transition(conn, trade_id, user_id, action, expected_version=None, **changes):
+    """Move a trade along TRADE_TRANSITIONS[action]; raises TradeConflict if it can't"""
+    trade = check_trade_action(conn, trade_id, user_id, action, expected_version)
+    return update_trade_state(conn, trade, TRADE_TRANSITIONS[action][1], **changes)
+
+
+def confirm_trade_details(conn, trade_id, user_id, expected_version=None):
+    """Record one trader's confirmation of the arrangement; the second one accepts the arrangement"""
+    trade = check_trade_action(conn, trade_id, user_id, 'confirm_details', expected_version)
+    column = 'user1_confirmed_details' if trade['offer_user_id'] == user_id else 'user2_confirmed_details'
+
+    flags = conn.execute(f"""
+        UPDATE trade_arrangements SET {column} = 1 WHERE trade_id = ?
+        RETURNING user1_confirmed_details, user2_confirmed_details
+    """, (trade_id,)).fetchall()
+    if not flags:
+        raise TradeConflict('Arrangement not found')
+
+    if all(flags[0]):
+        conn.execute("UPDATE trade_arrangements SET status = 'accepted' WHERE trade_id = ?", (trade_id,))
+    # The trade stays accepted; the write bumps its version and tells both traders
+    new_state = update_trade_state(conn, trade, trade['trade_status'])
+    return new_state, flags[0]
+
+
+def confirm_trade_receipt(conn, trade_id, user_id, expected_version=None, tracking_number=None):
+    """Record that user_id received their item; the second receipt completes the trade"""
+    trade = check_trade_action(conn, trade_id, user_id, 'confirm_receipt', expected_version)
+    side, other = ('offer', 'target') if trade['offer_user_id'] == user_id else ('target', 'offer')
+
+    received = {'offer': trade['offer_received'], 'target': trade['target_received'], side: 1}
+
+    # Keep the arrangement's receipt flags in step with the trade's
+    conn.execute("""
+        UPDATE trade_arrangements
+        SET user1_confirmed_receipt = ?, user2_confirmed_receipt = ?,
+            tracking_number = COALESCE(?, tracking_number)
+        WHERE trade_id = ?
+    """, (received['offer'], received['target'], tracking_number or None, trade_id))
+
+    completed = bool(received[other])
+    return update_trade_state(conn, trade, 'completed' if completed else trade['trade_status'],
+                              **{f'{side}_received': 1})
 
-        return active_trade is None
 
 # Add these new routes after your existing routes in app.py
 @app.route('/request_trade', methods=['GET', 'POST'])
@@ -889,82 +2534,42 @@ def request_trade():
         target_item_id = request.form['target_item_id']
         offer_item_id = request.form['offer_item_id']
 
-        with sqlite3.connect(DB_NAME) as conn:
-            # Check if target item exists and is available
-            target_item = conn.execute("""
-                SELECT user_id, item_Name FROM items 
-                WHERE items_id = ? AND user_id != ? 
-                AND item_available = 1
-                AND items_id NOT IN (
-                    SELECT offer_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                    UNION 
-                    SELECT target_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                )
-            """, (target_item_id, user_id)).fetchone()
-
-            if not target_item:
-                flash('Target item not found or unavailable for trading.', 'error')
-                return redirect(url_for('request_trade'))
-
-            # Check if offer item exists and is available
-            offer_item = conn.execute("""
-                SELECT item_Name FROM items 
-                WHERE items_id = ? AND user_id = ? 
-                AND item_available = 1
-                AND items_id NOT IN (
-                    SELECT offer_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                    UNION 
-                    SELECT target_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                )
-            """, (offer_item_id, user_id)).fetchone()
-
-            if not offer_item:
-                flash('Your offered item is unavailable for trading.', 'error')
-                return redirect(url_for('request_trade'))
-
-            # Create trade request
-            conn.execute("""
-                INSERT INTO trades (offer_user_id, target_user_id, offer_item_id, target_item_id)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, target_item[0], offer_item_id, target_item_id))
+        try:
+            with get_db() as conn:
+                create_trade_request(conn, user_id, offer_item_id, target_item_id)
+        except TradeConflict as e:
+            flash(str(e), 'error')
+            return redirect(url_for('request_trade'))
 
-            flash('Trade request sent successfully!', 'success')
-            return redirect(url_for('view_trade_requests'))
+        flash('Trade request sent successfully!', 'success')
+        return redirect(url_for('view_trade_requests'))
 
     # GET request - Show only available items
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
-        # Get other traders' available items
-        other_items = conn.execute("""
+        # Get other traders' available items, a page at a time
+        other_items, next_cursor, prev_cursor = fetch_keyset_page(conn, """
             SELECT i.*, u.username, u.full_name, u.location, u.contact
             FROM items i
             JOIN users u ON i.user_id = u.id
             WHERE i.user_id != ? 
             AND i.item_available = 1
-            AND i.items_id NOT IN (
-                SELECT offer_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                UNION 
-                SELECT target_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-            )
-            ORDER BY u.username ASC
-        """, (user_id,)).fetchall()
+            AND i.locked_by_trade_id IS NULL
+        """, (user_id,), ('username', 'items_id'), request.args.get('cursor'), get_page_size())
 
         # Get user's available items
         my_items = conn.execute("""
             SELECT * FROM items 
             WHERE user_id = ? 
             AND item_available = 1
-            AND items_id NOT IN (
-                SELECT offer_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-                UNION 
-                SELECT target_item_id FROM trades WHERE trade_status IN ('pending', 'accepted', 'completed')
-            )
+            AND locked_by_trade_id IS NULL
         """, (user_id,)).fetchall()
 
     return render_template('request_trade.html',
                            other_items=other_items,
                            my_items=my_items,
+                           next_cursor=next_cursor,
+                           prev_cursor=prev_cursor,
                            mode='request_trade')
 
 
@@ -977,8 +2582,7 @@ def view_trade_requests():
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
         trades = conn.execute("""
             SELECT t.*, 
@@ -1016,45 +2620,23 @@ def respond_trade(trade_id):
     user_id = session['user_id']
     action = request.form['action']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        # ✅ FIX: Check if user can perform this action based on action type
-        if action == 'cancel':
-            # User can cancel their own pending requests (offer user)
-            trade = conn.execute(
-                "SELECT * FROM trades WHERE trade_id = ? AND offer_user_id = ? AND trade_status = 'pending'",
-                (trade_id, user_id)
-            ).fetchone()
-        else:
-            # For accept/decline, user must be the target user
-            trade = conn.execute(
-                "SELECT * FROM trades WHERE trade_id = ? AND target_user_id = ? AND trade_status = 'pending'",
-                (trade_id, user_id)
-            ).fetchone()
-
-        if not trade:
-            flash('Trade not found or you cannot perform this action.', 'error')
-            return redirect(url_for('view_trade_requests'))
-
-        if action == 'accept':
-            conn.execute(
-                "UPDATE trades SET trade_status = 'accepted' WHERE trade_id = ?",
-                (trade_id,)
-            )
-            flash('Trade accepted successfully!', 'success')
-
-        elif action == 'decline':
-            conn.execute(
-                "UPDATE trades SET trade_status = 'declined' WHERE trade_id = ?",
-                (trade_id,)
-            )
-            flash('Trade declined.', 'info')
-
-        elif action == 'cancel':
-            conn.execute(
-                "UPDATE trades SET trade_status = 'cancelled' WHERE trade_id = ?",
-                (trade_id,)
-            )
-            flash('Trade cancelled.', 'info')
+    # accept/decline are the target user's answer; cancel withdraws the offer user's own request
+    transitions = {
+        'accept': ('accept', 'Trade accepted successfully!', 'success'),
+        'decline': ('decline', 'Trade declined.', 'info'),
+        'cancel': ('withdraw', 'Trade cancelled.', 'info'),
+    }
+    if action not in transitions:
+        flash('Trade not found or you cannot perform this action.', 'error')
+        return redirect(url_for('view_trade_requests'))
+
+    transition, message, category = transitions[action]
+    try:
+        with get_db() as conn:
+            apply_trade_transition(conn, trade_id, user_id, transition, requested_trade_version())
+        flash(message, category)
+    except TradeConflict as e:
+        flash(str(e), 'error')
 
     return redirect(url_for('view_trade_requests'))
 
@@ -1062,8 +2644,7 @@ def respond_trade(trade_id):
 @app.route('/debug/trade/<int:trade_id>')
 def debug_trade(trade_id):
     """Debug route to check trade arrangement"""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
         arrangement = conn.execute(
             "SELECT * FROM trade_arrangements WHERE trade_id = ?",
@@ -1087,8 +2668,7 @@ def debug_trade(trade_id):
 @app.route('/view_item/<int:item_id>')
 def view_item(item_id):
     """View single item details"""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         item = conn.execute("""
             SELECT i.*, u.username, u.full_name, u.location, u.contact
             FROM items i
@@ -1111,8 +2691,7 @@ def trade_history():
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
         history = conn.execute("""
             SELECT 
@@ -1153,6 +2732,76 @@ def trade_history():
     return render_template('trade_history.html', history=history, user_id=user_id)
 
 
+# Negotiation messages shown per page of the arrangement chat
+NEGOTIATION_PAGE_SIZE = 30
+
+# trade_arrangements gains columns through migrations, so its column list is
+# read from the schema once per process
+_arrangement_columns = None
+
+
+def get_arrangement_columns(conn):
+    """Column names of trade_arrangements"""
+    global _arrangement_columns
+    if _arrangement_columns is None:
+        _arrangement_columns = [row['name'] for row in conn.execute("PRAGMA table_info(trade_arrangements)")]
+    return _arrangement_columns
+
+
+def fetch_trade_with_arrangement(conn, trade_id, user_id):
+    """The trade (with item and trader names) and its arrangement, in one query.
+
+    Returns (trade, arrangement) as dicts; trade is None when user_id is not a
+    party to the trade and arrangement is None when none has been started.
+    """
+    arrangement_columns = get_arrangement_columns(conn)
+    aliased = ', '.join(f'ta.{column} AS "arrangement.{column}"' for column in arrangement_columns)
+    row = conn.execute(f"""
+        SELECT t.*, 
+               oi.item_Name as offer_item_name,
+               ti.item_Name as target_item_name,
+               offer_user.username as offer_username,
+               offer_user.full_name as offer_full_name,
+               target_user.username as target_username,
+               target_user.full_name as target_full_name,
+               {aliased}
+        FROM trades t
+        JOIN items oi ON t.offer_item_id = oi.items_id
+        JOIN items ti ON t.target_item_id = ti.items_id
+        JOIN users offer_user ON t.offer_user_id = offer_user.id
+        JOIN users target_user ON t.target_user_id = target_user.id
+        LEFT JOIN trade_arrangements ta ON ta.trade_id = t.trade_id
+        WHERE t.trade_id = ? AND (t.offer_user_id = ? OR t.target_user_id = ?)
+        ORDER BY ta.id
+        LIMIT 1
+    """, (trade_id, user_id, user_id)).fetchone()
+
+    if not row:
+        return None, None
+
+    trade, arrangement = {}, {}
+    for key in row.keys():
+        if key.startswith('arrangement.'):
+            arrangement[key[len('arrangement.'):]] = row[key]
+        else:
+            trade[key] = row[key]
+    return trade, arrangement if arrangement['id'] is not None else None
+
+
+def fetch_negotiation_messages(conn, trade_id, cursor=None, limit=NEGOTIATION_PAGE_SIZE):
+    """One page of a trade's negotiation messages, newest page first; returns (messages, older_cursor)"""
+    messages, older_cursor, _ = fetch_keyset_page(conn, """
+        SELECT tm.id, tm.trade_id, tm.user_id, tm.message_type, tm.content,
+               tm.suggested_location, tm.suggested_date, tm.created_at,
+               u.username, u.full_name
+        FROM trade_messages_negotiation tm
+        JOIN users u ON tm.user_id = u.id
+        WHERE tm.trade_id = ?
+    """, (trade_id,), ('created_at', 'id'), cursor, limit, descending=True)
+    # Pages are read newest first but shown oldest first
+    return [dict(message) for message in reversed(messages)], older_cursor
+
+
 @app.route('/trade/<int:trade_id>/arrangement', methods=['GET', 'POST'])
 def trade_arrangement(trade_id):
     """View and update trade arrangement details"""
@@ -1162,56 +2811,32 @@ def trade_arrangement(trade_id):
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
-        # Get trade details
-        trade = conn.execute("""
-            SELECT t.*, 
-                   oi.item_Name as offer_item_name,
-                   ti.item_Name as target_item_name,
-                   offer_user.username as offer_username,
-                   offer_user.full_name as offer_full_name,
-                   target_user.username as target_username,
-                   target_user.full_name as target_full_name
-            FROM trades t
-            JOIN items oi ON t.offer_item_id = oi.items_id
-            JOIN items ti ON t.target_item_id = ti.items_id
-            JOIN users offer_user ON t.offer_user_id = offer_user.id
-            JOIN users target_user ON t.target_user_id = target_user.id
-            WHERE t.trade_id = ? AND (t.offer_user_id = ? OR t.target_user_id = ?)
-        """, (trade_id, user_id, user_id)).fetchone()
+    with get_db() as conn:
+        trade, arrangement = fetch_trade_with_arrangement(conn, trade_id, user_id)
 
         if not trade:
             flash('Trade not found.', 'error')
             return redirect(url_for('view_trade_requests'))
 
-        # Get arrangement details
-        arrangement = conn.execute(
-            "SELECT * FROM trade_arrangements WHERE trade_id = ?",
-            (trade_id,)
-        ).fetchone()
-
-    if request.method == 'POST':
-        method = request.form.get('method')
-
-        # Get form data based on which user is submitting
-        if user_id == trade['offer_user_id']:
-            # Jaylord is updating his details
-            delivery_address = request.form.get('offer_delivery_address')
-            delivery_date = request.form.get('offer_delivery_date')
-            courier_option = request.form.get('offer_courier_option')
-            delivery_instructions = request.form.get('offer_delivery_instructions')
-            tracking_number = request.form.get('offer_tracking_number')
-        else:
-            # Keth is updating her details
-            delivery_address = request.form.get('target_delivery_address')
-            delivery_date = request.form.get('target_delivery_date')
-            courier_option = request.form.get('target_courier_option')
-            delivery_instructions = request.form.get('target_delivery_instructions')
-            tracking_number = request.form.get('target_tracking_number')
+        if request.method == 'POST':
+            method = request.form.get('method')
+
+            # Get form data based on which user is submitting
+            if user_id == trade['offer_user_id']:
+                # Jaylord is updating his details
+                delivery_address = request.form.get('offer_delivery_address')
+                delivery_date = request.form.get('offer_delivery_date')
+                courier_option = request.form.get('offer_courier_option')
+                delivery_instructions = request.form.get('offer_delivery_instructions')
+                tracking_number = request.form.get('offer_tracking_number')
+            else:
+                # Keth is updating her details
+                delivery_address = request.form.get('target_delivery_address')
+                delivery_date = request.form.get('target_delivery_date')
+                courier_option = request.form.get('target_courier_option')
+                delivery_instructions = request.form.get('target_delivery_instructions')
+                tracking_number = request.form.get('target_tracking_number')
 
-        with sqlite3.connect(DB_NAME) as conn:
             if not arrangement:
                 # Create new arrangement
                 if user_id == trade['offer_user_id']:
@@ -1266,66 +2891,56 @@ def trade_arrangement(trade_id):
             flash('Your delivery details have been updated! The other user needs to confirm the changes.', 'success')
             return redirect(url_for('trade_arrangement', trade_id=trade_id))
 
-    # GET request - reload the arrangement data after update
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        arrangement = conn.execute(
-            "SELECT * FROM trade_arrangements WHERE trade_id = ?",
-            (trade_id,)
-        ).fetchone()
-
-        # Get negotiation messages
-        messages = conn.execute("""
-            SELECT tm.*, u.username, u.full_name
-            FROM trade_messages_negotiation tm
-            JOIN users u ON tm.user_id = u.id
-            WHERE tm.trade_id = ?
-            ORDER BY tm.created_at ASC
-        """, (trade_id,)).fetchall()
+        messages, older_messages_cursor = fetch_negotiation_messages(conn, trade_id)
 
     return render_template('arrangement_details.html',
                            trade=trade,
                            arrangement=arrangement,
                            messages=messages,
+                           older_messages_cursor=older_messages_cursor,
                            user_id=user_id)
 
-@app.route('/trade/<int:trade_id>/cancel', methods=['POST'])
-def cancel_trade_arrangement(trade_id):
-    """Cancel trade from arrangement page"""
+
+@app.route('/trade/<int:trade_id>/messages')
+def trade_negotiation_messages(trade_id):
+    """Older negotiation messages for the arrangement chat (?cursor=)"""
     if 'user_id' not in session:
-        return jsonify({'status': 'error', 'message': 'Please login first'})
+        return jsonify({'status': 'error', 'message': 'Please login first'}), 401
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        # Verify user is part of this trade
+    with get_db() as conn:
         trade = conn.execute(
-            "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
+            "SELECT trade_id FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
             (trade_id, user_id, user_id)
         ).fetchone()
 
         if not trade:
-            return jsonify({'status': 'error', 'message': 'Trade not found'})
+            return jsonify({'status': 'error', 'message': 'Trade not found'}), 404
 
-        # Cancel the trade
-        conn.execute(
-            "UPDATE trades SET trade_status = 'cancelled' WHERE trade_id = ?",
-            (trade_id,)
+        messages, older_cursor = fetch_negotiation_messages(
+            conn, trade_id, request.args.get('cursor'), get_page_size(NEGOTIATION_PAGE_SIZE)
         )
 
-        # Also update arrangement status if exists
-        arrangement = conn.execute(
-            "SELECT * FROM trade_arrangements WHERE trade_id = ?",
-            (trade_id,)
-        ).fetchone()
+    return jsonify({'messages': messages, 'older_cursor': older_cursor})
 
-        if arrangement:
-            conn.execute(
-                "UPDATE trade_arrangements SET status = 'cancelled' WHERE trade_id = ?",
-                (trade_id,)
-            )
+@app.route('/trade/<int:trade_id>/cancel', methods=['POST'])
+def cancel_trade_arrangement(trade_id):
+    """Cancel trade from arrangement page"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': 'Please login first'})
 
-        return jsonify({'status': 'success', 'message': 'Trade cancelled successfully'})
+    user_id = session['user_id']
+    reason = (request.get_json(silent=True) or {}).get('reason') or ''
+
+    try:
+        with get_db() as conn:
+            apply_trade_transition(conn, trade_id, user_id, 'cancel', requested_trade_version(),
+                                   cancellation_reason=reason)
+    except TradeConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    return jsonify({'status': 'success', 'message': 'Trade cancelled successfully'})
 
 @app.route('/set_meetup_details/<int:trade_id>', methods=['POST'])
 def set_meetup_details(trade_id):
@@ -1337,7 +2952,7 @@ def set_meetup_details(trade_id):
     user_id = session['user_id']
     action = request.form['action']
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         # Verify user is part of this trade
         trade = conn.execute(
             "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
@@ -1385,7 +3000,7 @@ def set_delivery_details(trade_id):
     user_id = session['user_id']
     action = request.form['action']
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         # Verify user is part of this trade
         trade = conn.execute(
             "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
@@ -1422,6 +3037,24 @@ def set_delivery_details(trade_id):
 
     return redirect(url_for('trade_history'))
 
+def add_negotiation_message(conn, trade, user_id, message_type, content, suggested_location=None):
+    """Store a negotiation message and push it to both parties of the trade"""
+    message_id = conn.execute("""
+        INSERT INTO trade_messages_negotiation (trade_id, user_id, message_type, content, suggested_location)
+        VALUES (?, ?, ?, ?, ?)
+    """, (trade['trade_id'], user_id, message_type, content, suggested_location)).lastrowid
+
+    message = conn.execute("""
+        SELECT tm.id, tm.trade_id, tm.user_id, tm.message_type, tm.content, tm.suggested_location,
+               tm.created_at, u.username, u.full_name
+        FROM trade_messages_negotiation tm
+        JOIN users u ON tm.user_id = u.id
+        WHERE tm.id = ?
+    """, (message_id,)).fetchone()
+    publish_event(conn, (trade['offer_user_id'], trade['target_user_id']), 'negotiation_message', dict(message))
+    return message_id
+
+
 @app.route('/trade/<int:trade_id>/suggest_location', methods=['POST'])
 def suggest_location(trade_id):
     """Suggest a location for trade arrangement"""
@@ -1432,7 +3065,7 @@ def suggest_location(trade_id):
     data = request.json
     location = data.get('location')
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         # Verify user is part of this trade
         trade = conn.execute(
             "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
@@ -1443,10 +3076,8 @@ def suggest_location(trade_id):
             return jsonify({'status': 'error', 'message': 'Trade not found'})
 
         # Create suggestion message
-        conn.execute("""
-            INSERT INTO trade_messages_negotiation (trade_id, user_id, message_type, content, suggested_location)
-            VALUES (?, ?, 'location_suggestion', ?, ?)
-        """, (trade_id, user_id, f"Suggested location: {location}", location))
+        add_negotiation_message(conn, trade, user_id, 'location_suggestion',
+                                f"Suggested location: {location}", location)
 
         return jsonify({'status': 'success', 'message': 'Location suggestion sent'})
 
@@ -1459,7 +3090,7 @@ def send_negotiation_message(trade_id):
     user_id = session['user_id']
     message_text = request.json.get('message')
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         # Verify user is part of this trade
         trade = conn.execute(
             "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
@@ -1470,33 +3101,28 @@ def send_negotiation_message(trade_id):
             return jsonify({'status': 'error', 'message': 'Trade not found'})
 
         # Save message
-        conn.execute("""
-            INSERT INTO trade_messages_negotiation (trade_id, user_id, message_type, content)
-            VALUES (?, ?, 'text', ?)
-        """, (trade_id, user_id, message_text))
+        add_negotiation_message(conn, trade, user_id, 'text', message_text)
 
         return jsonify({'status': 'success', 'message': 'Message sent'})
 
 @app.route('/trade/<int:trade_id>/status')
 def get_trade_status(trade_id):
-    """Check if trade status has changed"""
+    """Current trade and arrangement status (long-polled with ?wait= under asgi.py)"""
     if 'user_id' not in session:
         return jsonify({'status': 'error'})
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        arrangement = conn.execute(
-            "SELECT status, user1_confirmed_details, user2_confirmed_details FROM trade_arrangements WHERE trade_id = ?",
-            (trade_id,)
-        ).fetchone()
+    with get_db() as conn:
+        status = fetch_trade_status(conn, trade_id)
+
+    if not status or user_id not in (status['offer_user_id'], status['target_user_id']):
+        return jsonify({'status': 'error', 'message': 'Trade not found'})
 
-        # You might want to compare with previous state
-        return jsonify({
-            'status_changed': True,  # Implement proper comparison logic
-            'current_status': arrangement['status'] if arrangement else 'pending'
-        })
+    return jsonify({
+        **dict(status),
+        'current_status': status['arrangement_status'] or 'pending'
+    })
 
 @app.route('/cancel_trade/<int:trade_id>', methods=['POST'])
 def cancel_trade(trade_id):
@@ -1508,97 +3134,47 @@ def cancel_trade(trade_id):
     user_id = session['user_id']
     reason = request.form.get('cancellation_reason', '')
 
-    with sqlite3.connect(DB_NAME) as conn:
-        # Verify user is part of this trade
-        trade = conn.execute(
-            "SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)",
-            (trade_id, user_id, user_id)
-        ).fetchone()
-
-        if not trade:
-            flash('Trade not found.', 'error')
-            return redirect(url_for('trade_history'))
-
-        # Cancel the trade
-        conn.execute(
-            "UPDATE trades SET trade_status = 'cancelled', cancellation_reason = ? WHERE trade_id = ?",
-            (reason, trade_id)
-        )
-
+    try:
+        with get_db() as conn:
+            apply_trade_transition(conn, trade_id, user_id, 'cancel', requested_trade_version(),
+                                   cancellation_reason=reason)
         flash('Trade has been cancelled.', 'info')
+    except TradeConflict as e:
+        flash(str(e), 'error')
 
     return redirect(url_for('trade_history'))
 
 
 @app.route('/trade/<int:trade_id>/confirm_details', methods=['POST'])
 def confirm_arrangement_details(trade_id):
-    """Confirm arrangement details - FIXED VERSION"""
+    """Confirm arrangement details"""
     if 'user_id' not in session:
         return jsonify({'status': 'error', 'message': 'Please login first'})
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
-        # Verify user is part of this trade and get arrangement
-        arrangement = conn.execute("""
-            SELECT ta.*, t.offer_user_id, t.target_user_id 
-            FROM trade_arrangements ta
-            JOIN trades t ON ta.trade_id = t.trade_id
-            WHERE ta.trade_id = ? AND (t.offer_user_id = ? OR t.target_user_id = ?)
-        """, (trade_id, user_id, user_id)).fetchone()
-
-        if not arrangement:
-            return jsonify({'status': 'error', 'message': 'Arrangement not found'})
-
-        # Determine which user is confirming
-        if user_id == arrangement['offer_user_id']:
-            conn.execute(
-                "UPDATE trade_arrangements SET user1_confirmed_details = 1 WHERE trade_id = ?",
-                (trade_id,)
-            )
-            user_role = "offer user"
-        else:
-            conn.execute(
-                "UPDATE trade_arrangements SET user2_confirmed_details = 1 WHERE trade_id = ?",
-                (trade_id,)
-            )
-            user_role = "target user"
-
-        # Check if both confirmed
-        updated_arrangement = conn.execute(
-            "SELECT user1_confirmed_details, user2_confirmed_details, status FROM trade_arrangements WHERE trade_id = ?",
-            (trade_id,)
-        ).fetchone()
-
-        if updated_arrangement['user1_confirmed_details'] and updated_arrangement['user2_confirmed_details']:
-            # Both users confirmed - update status to accepted
-            conn.execute(
-                "UPDATE trade_arrangements SET status = 'accepted' WHERE trade_id = ?",
-                (trade_id,)
-            )
-            # Also update the main trade status
-            conn.execute(
-                "UPDATE trades SET trade_status = 'accepted' WHERE trade_id = ?",
-                (trade_id,)
-            )
-            arrangement_status = 'accepted'
-            message = '🎉 Both users have confirmed! Trade is now accepted and ready for exchange.'
-        else:
-            arrangement_status = 'pending'
-            message = '✅ Your confirmation has been recorded. Waiting for other user to confirm.'
-
-        conn.commit()
+    try:
+        with get_db() as conn:
+            new_state, flags = confirm_trade_details(conn, trade_id, user_id, requested_trade_version())
+    except TradeConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    if flags['user1_confirmed_details'] and flags['user2_confirmed_details']:
+        arrangement_status = 'accepted'
+        message = '🎉 Both users have confirmed! Trade is now accepted and ready for exchange.'
+    else:
+        arrangement_status = 'pending'
+        message = '✅ Your confirmation has been recorded. Waiting for other user to confirm.'
 
-        return jsonify({
-            'status': 'success',
-            'message': message,
-            'arrangement_status': arrangement_status,
-            'user_confirmed': user_role,
-            'user1_confirmed': bool(updated_arrangement['user1_confirmed_details']),
-            'user2_confirmed': bool(updated_arrangement['user2_confirmed_details'])
-        })
+    return jsonify({
+        'status': 'success',
+        'message': message,
+        'arrangement_status': arrangement_status,
+        'user_confirmed': "offer user" if user_id == new_state['offer_user_id'] else "target user",
+        'user1_confirmed': bool(flags['user1_confirmed_details']),
+        'user2_confirmed': bool(flags['user2_confirmed_details']),
+        'version': new_state['version']
+    })
 
 @app.route('/confirm_meetup_location/<int:trade_id>')
 def confirm_meetup_location(trade_id):
@@ -1609,7 +3185,7 @@ def confirm_meetup_location(trade_id):
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         # Verify user can confirm (should be the other party)
         trade = conn.execute(
             "SELECT * FROM trades WHERE trade_id = ? AND offer_user_id = ?",
@@ -1635,172 +3211,43 @@ def mark_item_received(trade_id):
     """Mark item as received from trade history - MARK ITEMS AS UNAVAILABLE"""
     if 'user_id' not in session:
         flash('Please login first.', 'warning')
-        return redirect(url_for('login'))
-
-    user_id = session['user_id']
-
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-
-        # Get trade details
-        trade = conn.execute("""
-            SELECT * FROM trades 
-            WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)
-        """, (trade_id, user_id, user_id)).fetchone()
-
-        if not trade:
-            flash('Trade not found.', 'error')
-            return redirect(url_for('trade_history'))
-
-        # Mark item as received in BOTH tables
-        if trade['offer_user_id'] == user_id:
-            # User is the offer user - mark their received item
-            conn.execute(
-                "UPDATE trades SET offer_received = 1 WHERE trade_id = ?",
-                (trade_id,)
-            )
-            flash('You marked your received item!', 'success')
-        else:
-            # User is the target user - mark their received item
-            conn.execute(
-                "UPDATE trades SET target_received = 1 WHERE trade_id = ?",
-                (trade_id,)
-            )
-            flash('You marked your received item!', 'success')
-
-        # Check if both users have received items
-        updated_trade = conn.execute(
-            "SELECT offer_received, target_received FROM trades WHERE trade_id = ?",
-            (trade_id,)
-        ).fetchone()
-
-        # MARK ITEMS AS UNAVAILABLE WHEN TRADE IS COMPLETED
-        if updated_trade['offer_received'] and updated_trade['target_received']:
-            # Both users have received items - mark trade as completed
-            conn.execute(
-                "UPDATE trades SET trade_status = 'completed' WHERE trade_id = ?",
-                (trade_id,)
-            )
+        return redirect(url_for('login'))
 
-            # MARK BOTH ITEMS AS UNAVAILABLE - VERY IMPORTANT!
-            conn.execute(
-                "UPDATE items SET item_available = 0 WHERE items_id = ?",
-                (trade['offer_item_id'],)
-            )
-            conn.execute(
-                "UPDATE items SET item_available = 0 WHERE items_id = ?",
-                (trade['target_item_id'],)
-            )
+    user_id = session['user_id']
+
+    try:
+        with get_db() as conn:
+            new_state = confirm_trade_receipt(conn, trade_id, user_id, requested_trade_version())
+    except TradeConflict as e:
+        flash(str(e), 'error')
+        return redirect(url_for('trade_history'))
 
-            flash('🎉 Trade completed! Both items received and marked as unavailable for future trades.', 'success')
+    flash('You marked your received item!', 'success')
+    if new_state['trade_status'] == 'completed':
+        flash('🎉 Trade completed! Both items received and marked as unavailable for future trades.', 'success')
 
     return redirect(url_for('trade_history'))
 
 @app.route('/trade/<int:trade_id>/confirm_receipt', methods=['POST'])
 def confirm_item_receipt(trade_id):
-    """Mark item as received in unified system - DEBUG VERSION"""
-    print(f"DEBUG: confirm_receipt called for trade {trade_id}")
-
+    """Mark item as received from the arrangement page"""
     if 'user_id' not in session:
-        print("DEBUG: User not logged in")
         return jsonify({'status': 'error', 'message': 'Please login first'})
 
     user_id = session['user_id']
-    print(f"DEBUG: User ID: {user_id}")
-
-    # Get JSON data properly
-    if request.is_json:
-        data = request.get_json()
-        tracking_number = data.get('tracking_number', '') if data else ''
-    else:
-        tracking_number = ''
-
-    print(f"DEBUG: Tracking number: {tracking_number}")
+    tracking_number = (request.get_json(silent=True) or {}).get('tracking_number', '')
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
-
-            # Verify user is part of this trade and get arrangement
-            arrangement = conn.execute("""
-                SELECT ta.*, t.offer_user_id, t.target_user_id 
-                FROM trade_arrangements ta
-                JOIN trades t ON ta.trade_id = t.trade_id
-                WHERE ta.trade_id = ? AND (t.offer_user_id = ? OR t.target_user_id = ?)
-            """, (trade_id, user_id, user_id)).fetchone()
-
-            if not arrangement:
-                print("DEBUG: Arrangement not found")
-                return jsonify({'status': 'error', 'message': 'Arrangement not found'})
-
-            print(
-                f"DEBUG: Found arrangement - User1: {arrangement['offer_user_id']}, User2: {arrangement['target_user_id']}")
-
-            # Determine which user is marking received
-            if user_id == arrangement['offer_user_id']:
-                print("DEBUG: User is offer_user - marking user1_confirmed_receipt")
-                conn.execute(
-                    "UPDATE trade_arrangements SET user1_confirmed_receipt = 1 WHERE trade_id = ?",
-                    (trade_id,)
-                )
-                # Also update the trades table
-                conn.execute(
-                    "UPDATE trades SET offer_received = 1 WHERE trade_id = ?",
-                    (trade_id,)
-                )
-                user_role = "offer user"
-            else:
-                print("DEBUG: User is target_user - marking user2_confirmed_receipt")
-                conn.execute(
-                    "UPDATE trade_arrangements SET user2_confirmed_receipt = 1 WHERE trade_id = ?",
-                    (trade_id,)
-                )
-                # Also update the trades table
-                conn.execute(
-                    "UPDATE trades SET target_received = 1 WHERE trade_id = ?",
-                    (trade_id,)
-                )
-                user_role = "target user"
-
-            # Update tracking number if provided
-            if tracking_number:
-                print(f"DEBUG: Updating tracking number: {tracking_number}")
-                conn.execute(
-                    "UPDATE trade_arrangements SET tracking_number = ? WHERE trade_id = ?",
-                    (tracking_number, trade_id)
-                )
+        with get_db() as conn:
+            new_state = confirm_trade_receipt(conn, trade_id, user_id, requested_trade_version(), tracking_number)
+    except TradeConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)})
 
-            # Check if both received
-            updated_arrangement = conn.execute(
-                "SELECT user1_confirmed_receipt, user2_confirmed_receipt FROM trade_arrangements WHERE trade_id = ?",
-                (trade_id,)
-            ).fetchone()
-
-            print(
-                f"DEBUG: After update - User1 received: {updated_arrangement['user1_confirmed_receipt']}, User2 received: {updated_arrangement['user2_confirmed_receipt']}")
-
-            if updated_arrangement['user1_confirmed_receipt'] and updated_arrangement['user2_confirmed_receipt']:
-                print("DEBUG: Both users confirmed receipt - marking as completed")
-                conn.execute(
-                    "UPDATE trade_arrangements SET status = 'completed' WHERE trade_id = ?",
-                    (trade_id,)
-                )
-                # Also update the main trade status
-                conn.execute(
-                    "UPDATE trades SET trade_status = 'completed' WHERE trade_id = ?",
-                    (trade_id,)
-                )
-                conn.commit()
-                return jsonify(
-                    {'status': 'completed', 'message': '🎉 Both items received! Trade completed successfully.'})
-            else:
-                conn.commit()
-                return jsonify({'status': 'waiting',
-                                'message': f'✅ You marked your item as received! Waiting for other user to confirm.'})
-
-    except Exception as e:
-        print(f"DEBUG: Error occurred: {str(e)}")
-        return jsonify({'status': 'error', 'message': f'Database error: {str(e)}'})
+    if new_state['trade_status'] == 'completed':
+        return jsonify({'status': 'completed', 'version': new_state['version'],
+                        'message': '🎉 Both items received! Trade completed successfully.'})
+    return jsonify({'status': 'waiting', 'version': new_state['version'],
+                    'message': '✅ You marked your item as received! Waiting for other user to confirm.'})
 
 @app.route('/trade/<int:trade_id>/complete_trade', methods=['POST'])
 def complete_trade(trade_id):
@@ -1811,31 +3258,94 @@ def complete_trade(trade_id):
     user_id = session['user_id']
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
-            conn.row_factory = sqlite3.Row
-
-            # Get trade details
-            trade = conn.execute("""
-                SELECT * FROM trades WHERE trade_id = ? AND (offer_user_id = ? OR target_user_id = ?)
-            """, (trade_id, user_id, user_id)).fetchone()
-
-            if not trade:
-                return jsonify({'status': 'error', 'message': 'Trade not found'})
-
-            # Mark items as unavailable
-            conn.execute("UPDATE items SET item_available = 0 WHERE items_id = ?", (trade['offer_item_id'],))
-            conn.execute("UPDATE items SET item_available = 0 WHERE items_id = ?", (trade['target_item_id'],))
+        with get_db() as conn:
+            apply_trade_transition(conn, trade_id, user_id, 'complete', requested_trade_version())
+    except TradeConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)})
+
+    return jsonify({'status': 'success', 'message': 'Trade completed successfully! Items marked as unavailable.'})
+
+def record_message(conn, sender_id, receiver_id, message_text):
+    """Insert a direct message and roll it into the pair's conversations row"""
+    message_id = conn.execute("""
+        INSERT INTO trade_messages (sender_id, receiver_id, message_text)
+        VALUES (?, ?, ?)
+    """, (sender_id, receiver_id, message_text)).lastrowid
+
+    sender_id, receiver_id = int(sender_id), int(receiver_id)
+    low_id, high_id = sorted((sender_id, receiver_id))
+    unread_low, unread_high = (1, 0) if receiver_id == low_id else (0, 1)
+    conn.execute("""
+        INSERT INTO conversations (user_low_id, user_high_id, last_message_id, last_message_at, unread_low, unread_high)
+        SELECT ?, ?, message_id, message_date, ?, ? FROM trade_messages WHERE message_id = ?
+        ON CONFLICT (user_low_id, user_high_id) DO UPDATE SET
+            last_message_id = excluded.last_message_id,
+            last_message_at = excluded.last_message_at,
+            unread_low = unread_low + excluded.unread_low,
+            unread_high = unread_high + excluded.unread_high
+    """, (low_id, high_id, unread_low, unread_high, message_id))
+
+    message = conn.execute("""
+        SELECT message_id, sender_id, receiver_id, message_text, message_date
+        FROM trade_messages WHERE message_id = ?
+    """, (message_id,)).fetchone()
+    publish_event(conn, (sender_id, receiver_id), 'chat_message', dict(message))
+    return message_id
+
+
+def mark_conversation_read(conn, user_id, partner_id):
+    """Clear the user's unread count for their conversation with partner_id"""
+    user_id, partner_id = int(user_id), int(partner_id)
+    column = 'unread_low' if user_id < partner_id else 'unread_high'
+    conn.execute(f"""
+        UPDATE conversations SET {column} = 0
+        WHERE user_low_id = ? AND user_high_id = ? AND {column} > 0
+    """, tuple(sorted((user_id, partner_id))))
+
+
+# Chat history is read in pages of message ids, so opening or polling a long
+# conversation only touches the newest messages
+CHAT_PAGE_SIZE = 50
+
+
+def fetch_chat_messages(conn, user_id, partner_id, after=None, before=None, limit=CHAT_PAGE_SIZE):
+    """Messages between two traders, oldest first.
+
+    With after, returns up to limit messages newer than that id; otherwise the
+    newest limit messages older than before (or the latest ones). Each direction
+    of the pair is read from its own (sender_id, receiver_id) index range.
+    """
+    if after is not None:
+        condition, order, bound = "message_id > ?", "ASC", after
+    else:
+        condition, order, bound = "message_id < ?", "DESC", before if before is not None else 2 ** 63 - 1
+
+    half = f"""
+        SELECT * FROM (
+            SELECT message_id, sender_id, receiver_id, message_text, message_date
+            FROM trade_messages
+            WHERE sender_id = ? AND receiver_id = ? AND {condition}
+            ORDER BY message_id {order} LIMIT ?
+        )
+    """
+    rows = conn.execute(f"""
+        {half} UNION ALL {half}
+        ORDER BY message_id {order} LIMIT ?
+    """, (user_id, partner_id, bound, limit, partner_id, user_id, bound, limit, limit)).fetchall()
 
-            # Update trade status to completed
-            conn.execute("UPDATE trades SET trade_status = 'completed' WHERE trade_id = ?", (trade_id,))
+    return rows if after is not None else rows[::-1]
 
-            # Update arrangement status
-            conn.execute("UPDATE trade_arrangements SET status = 'completed' WHERE trade_id = ?", (trade_id,))
 
-            return jsonify({'status': 'success', 'message': 'Trade completed successfully! Items marked as unavailable.'})
+def message_to_dict(message, user_id):
+    """JSON shape of a chat message as seen by user_id"""
+    return {
+        'message_id': message['message_id'],
+        'sender_id': message['sender_id'],
+        'message_text': message['message_text'],
+        'message_date': message['message_date'],
+        'mine': message['sender_id'] == user_id,
+    }
 
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': f'Error completing trade: {str(e)}'})
 
 @app.route('/send_message', methods=['GET', 'POST'])
 def send_message():
@@ -1854,7 +3364,7 @@ def send_message():
             flash('Message cannot be empty.', 'error')
             return redirect(url_for('send_message'))
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             # Verify receiver exists
             receiver = conn.execute(
                 "SELECT id FROM users WHERE id = ? AND is_admin = 0",
@@ -1866,17 +3376,13 @@ def send_message():
                 return redirect(url_for('send_message'))
 
             # Send message
-            conn.execute("""
-                INSERT INTO trade_messages (sender_id, receiver_id, message_text)
-                VALUES (?, ?, ?)
-            """, (user_id, receiver_id, message_text))
+            record_message(conn, user_id, receiver_id, message_text)
 
             flash('Message sent successfully!', 'success')
             return redirect(url_for('view_messages'))
 
     # GET request - show list of traders
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         traders = conn.execute("""
             SELECT id, username, full_name, location, contact 
             FROM users 
@@ -1895,26 +3401,24 @@ def view_messages():
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
-        # Get list of traders the user has chatted with
+        # One conversations row per partner, newest first, with its last message as preview
         chat_partners = conn.execute("""
-            SELECT DISTINCT 
-                CASE 
-                    WHEN sender_id = ? THEN receiver_id 
-                    ELSE sender_id 
-                END AS partner_id,
-                u.username,
-                u.full_name
-            FROM trade_messages m
-            JOIN users u ON u.id = CASE 
-                WHEN m.sender_id = ? THEN m.receiver_id 
-                ELSE m.sender_id 
-            END
-            WHERE sender_id = ? OR receiver_id = ?
-            ORDER BY u.username ASC
-        """, (user_id, user_id, user_id, user_id)).fetchall()
+            SELECT c.partner_id, c.unread_count, c.last_message_at,
+                   u.username, u.full_name,
+                   m.message_text AS last_message, m.sender_id AS last_sender_id
+            FROM (
+                SELECT user_high_id AS partner_id, unread_low AS unread_count, last_message_id, last_message_at
+                FROM conversations WHERE user_low_id = ?
+                UNION ALL
+                SELECT user_low_id, unread_high, last_message_id, last_message_at
+                FROM conversations WHERE user_high_id = ?
+            ) c
+            JOIN users u ON u.id = c.partner_id
+            JOIN trade_messages m ON m.message_id = c.last_message_id
+            ORDER BY c.last_message_id DESC
+        """, (user_id, user_id)).fetchall()
 
     return render_template('view_messages.html', chat_partners=chat_partners)
 
@@ -1935,7 +3439,7 @@ def chat(partner_id):
             flash('Message cannot be empty.', 'error')
             return redirect(url_for('chat', partner_id=partner_id))
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             # Verify partner exists
             partner = conn.execute(
                 "SELECT id FROM users WHERE id = ? AND id != ?",
@@ -1947,16 +3451,12 @@ def chat(partner_id):
                 return redirect(url_for('view_messages'))
 
             # Send message
-            conn.execute("""
-                INSERT INTO trade_messages (sender_id, receiver_id, message_text)
-                VALUES (?, ?, ?)
-            """, (user_id, partner_id, message_text))
+            record_message(conn, user_id, partner_id, message_text)
 
             return redirect(url_for('chat', partner_id=partner_id))
 
     # GET request - show chat history
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
         # Get partner info
         partner = conn.execute(
@@ -1968,27 +3468,70 @@ def chat(partner_id):
             flash('Trader not found.', 'error')
             return redirect(url_for('view_messages'))
 
-        # Get chat history
-        messages = conn.execute("""
-            SELECT m.*, 
-                   sender.username as sender_username,
-                   sender.full_name as sender_full_name,
-                   receiver.username as receiver_username
-            FROM trade_messages m
-            JOIN users sender ON m.sender_id = sender.id
-            JOIN users receiver ON m.receiver_id = receiver.id
-            WHERE (m.sender_id = ? AND m.receiver_id = ?) 
-               OR (m.sender_id = ? AND m.receiver_id = ?)
-            ORDER BY m.message_date ASC
-        """, (user_id, partner_id, partner_id, user_id)).fetchall()
+        mark_conversation_read(conn, user_id, partner_id)
+
+        # Latest page of history; older pages and new messages come from chat_messages
+        messages = fetch_chat_messages(conn, user_id, partner_id, limit=CHAT_PAGE_SIZE + 1)
+        has_older = len(messages) > CHAT_PAGE_SIZE
+        messages = messages[-CHAT_PAGE_SIZE:]
 
     return render_template('chat.html',
                            messages=messages,
+                           has_older=has_older,
                            partner=partner,
                            partner_id=partner_id,
                            user_id=user_id)
 
 
+
+@app.route('/chat/<int:partner_id>/messages', methods=['GET', 'POST'])
+def chat_messages(partner_id):
+    """JSON chat history: ?after=<id> for new messages, ?before=<id> for older ones"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': 'Please login first.'}), 401
+
+    user_id = session['user_id']
+
+    with get_db() as conn:
+        partner = conn.execute(
+            "SELECT id FROM users WHERE id = ? AND id != ?",
+            (partner_id, user_id)
+        ).fetchone()
+
+        if not partner:
+            return jsonify({'status': 'error', 'message': 'Trader not found.'}), 404
+
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or request.form
+            message_text = (data.get('message_text') or '').strip()
+            if not message_text:
+                return jsonify({'status': 'error', 'message': 'Message cannot be empty.'}), 400
+
+            message_id = record_message(conn, user_id, partner_id, message_text)
+            message = conn.execute(
+                "SELECT message_id, sender_id, message_text, message_date FROM trade_messages WHERE message_id = ?",
+                (message_id,)
+            ).fetchone()
+            return jsonify({'status': 'success', 'message': message_to_dict(message, user_id)}), 201
+
+        after = request.args.get('after', type=int)
+        before = request.args.get('before', type=int)
+        limit = get_page_size(CHAT_PAGE_SIZE)
+
+        messages = fetch_chat_messages(conn, user_id, partner_id, after, before, limit + 1)
+        has_more = len(messages) > limit
+        messages = messages[:limit] if after is not None else messages[-limit:]
+
+        # New messages from the partner are on screen now
+        if any(message['sender_id'] == partner_id for message in messages):
+            mark_conversation_read(conn, user_id, partner_id)
+
+    return jsonify({
+        'messages': [message_to_dict(message, user_id) for message in messages],
+        'has_more': has_more,
+    })
+
+
 # Add these profile routes after your existing routes
 
 @app.route('/profile', methods=['GET', 'POST'])
@@ -2012,7 +3555,7 @@ def profile():
         # Check if password is being updated
         new_password = request.form.get('new_password')
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             try:
                 if new_password:
                     # Update with new password
@@ -2020,7 +3563,7 @@ def profile():
                         UPDATE users 
                         SET username=?, email=?, password=?, full_name=?, contact=?, birthdate=?, location=?
                         WHERE id=?
-                    """, (username, email, new_password, full_name, contact, birthdate, location, user_id))
+                    """, (username, email, hash_password(new_password), full_name, contact, birthdate, location, user_id))
                     flash('Profile and password updated successfully!', 'success')
                 else:
                     # Update without changing password
@@ -2041,8 +3584,7 @@ def profile():
                 return redirect(url_for('profile'))
 
     # GET request - load current user data
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         user = conn.execute(
             "SELECT * FROM users WHERE id = ?",
             (user_id,)
@@ -2067,21 +3609,21 @@ def change_password():
         flash('New passwords do not match!', 'error')
         return redirect(url_for('profile'))
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         # Verify current password
         user = conn.execute(
-            "SELECT password FROM users WHERE id = ? AND password = ?",
-            (user_id, current_password)
+            "SELECT password FROM users WHERE id = ?",
+            (user_id,)
         ).fetchone()
 
-        if not user:
+        if not user or not check_password(current_password, user['password'])[0]:
             flash('Current password is incorrect!', 'error')
             return redirect(url_for('profile'))
 
         # Update password
         conn.execute(
             "UPDATE users SET password = ? WHERE id = ?",
-            (new_password, user_id)
+            (hash_password(new_password), user_id)
         )
 
     flash('Password changed successfully!', 'success')
@@ -2097,31 +3639,27 @@ def ratings():
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
 
-        # Get all NON-ADMIN users with their average ratings
+        # Get all NON-ADMIN users with their average ratings (one reputation row each)
         all_users = conn.execute("""
             SELECT u.id, u.username, u.full_name, u.location,
-                   COALESCE(AVG(ur.rating), 0) as average_rating,
-                   COUNT(ur.id) as total_ratings,
-                   COUNT(DISTINCT t.trade_id) as total_trades
+                   COALESCE(1.0 * r.rating_sum / NULLIF(r.rating_count, 0), 0) as average_rating,
+                   COALESCE(r.rating_count, 0) as total_ratings,
+                   COALESCE(r.completed_trades, 0) as total_trades
             FROM users u
-            LEFT JOIN user_ratings ur ON u.id = ur.rated_user_id
-            LEFT JOIN trades t ON (u.id = t.offer_user_id OR u.id = t.target_user_id) AND t.trade_status = 'completed'
+            LEFT JOIN user_reputation r ON r.user_id = u.id
             WHERE u.id != ? AND u.is_admin = 0  -- EXCLUDE ADMIN USERS
-            GROUP BY u.id, u.username, u.full_name, u.location
             ORDER BY average_rating DESC, total_ratings DESC
         """, (user_id,)).fetchall()
 
         # Get current user's rating stats - KEEP THE ORIGINAL VARIABLE NAME
-        user_rating = conn.execute("""
-            SELECT 
-                AVG(rating) as average_rating,
-                COUNT(*) as total_ratings
-            FROM user_ratings 
-            WHERE rated_user_id = ?
-        """, (user_id,)).fetchone()
+        reputation = get_user_reputation(conn, user_id)
+        user_rating = {
+            'average_rating': reputation['average_rating'],
+            'total_ratings': reputation['rating_count'],
+            **{f"{star}_star": reputation[column] for star, column in STAR_COLUMNS.items()},
+        }
 
     return render_template('ratings.html',
                            all_users=all_users,
@@ -2143,7 +3681,7 @@ def rate_user(trade_id, user_to_rate_id):
         return redirect(url_for('ratings'))
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             # Verify trade exists and user can rate
             trade = conn.execute("""
                 SELECT * FROM trades 
@@ -2170,6 +3708,7 @@ def rate_user(trade_id, user_to_rate_id):
                 INSERT INTO user_ratings (rated_user_id, rating_user_id, trade_id, rating, comment)
                 VALUES (?, ?, ?, ?, ?)
             """, (user_to_rate_id, user_id, trade_id, int(rating), comment))
+            record_rating(conn, user_to_rate_id, int(rating))
 
             flash('Rating submitted successfully!', 'success')
             return redirect(url_for('ratings'))
@@ -2196,7 +3735,7 @@ def report_user():
         return redirect(url_for('ratings'))
 
     try:
-        with sqlite3.connect(DB_NAME) as conn:
+        with get_db() as conn:
             # Verify trade exists and user is part of it
             trade = conn.execute("""
                 SELECT * FROM trades 
@@ -2223,20 +3762,8 @@ def report_user():
 @app.route('/get_user_rating_stats/<int:user_id>')
 def get_user_rating_stats(user_id):
     """Get user rating statistics for AJAX requests"""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        stats = conn.execute("""
-            SELECT 
-                AVG(rating) as average_rating,
-                COUNT(*) as total_ratings,
-                COUNT(CASE WHEN rating = 5 THEN 1 END) as five_star,
-                COUNT(CASE WHEN rating = 4 THEN 1 END) as four_star,
-                COUNT(CASE WHEN rating = 3 THEN 1 END) as three_star,
-                COUNT(CASE WHEN rating = 2 THEN 1 END) as two_star,
-                COUNT(CASE WHEN rating = 1 THEN 1 END) as one_star
-            FROM user_ratings 
-            WHERE rated_user_id = ?
-        """, (user_id,)).fetchone()
+    with get_db() as conn:
+        stats = get_user_reputation(conn, user_id)
 
         recent_comments = conn.execute("""
             SELECT ur.comment, ur.rating, ur.created_at, u.username, u.full_name
@@ -2249,13 +3776,9 @@ def get_user_rating_stats(user_id):
 
     return jsonify({
         'average_rating': round(stats['average_rating'] or 0, 1),
-        'total_ratings': stats['total_ratings'] or 0,
+        'total_ratings': stats['rating_count'],
         'rating_breakdown': {
-            '5_star': stats['five_star'] or 0,
-            '4_star': stats['four_star'] or 0,
-            '3_star': stats['three_star'] or 0,
-            '2_star': stats['two_star'] or 0,
-            '1_star': stats['one_star'] or 0
+            f"{star}_star": stats[column] for star, column in STAR_COLUMNS.items()
         },
         'recent_comments': [dict(comment) for comment in recent_comments]
     })
@@ -2289,7 +3812,7 @@ def submit_recommendation():
     description = request.form['description']
     contact_ok = request.form.get('contact_ok', 0)
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("""
             INSERT INTO user_recommendations 
             (user_id, feedback_type, priority, title, description, contact_ok, status)
@@ -2310,8 +3833,8 @@ def create_my_admin():
     location = "Admin Location"
     contact = "Admin Contact"
 
-    with sqlite3.connect(DB_NAME) as conn:
-        try:
+    try:
+        with get_db() as conn:
             # Check if user already exists
             existing_user = conn.execute(
                 "SELECT id FROM users WHERE username = ? OR email = ?",
@@ -2320,7 +3843,8 @@ def create_my_admin():
 
             if existing_user:
                 # Add existing user to admin table
-                success = add_user_to_admin(existing_user[0], username, email, full_name)
+                admin_user_id = existing_user[0]
+                success = add_user_to_admin(conn, admin_user_id, username, email, full_name)
                 if success:
                     message = "User already exists! Added to admin table."
                 else:
@@ -2330,64 +3854,55 @@ def create_my_admin():
                 cursor = conn.execute("""
                     INSERT INTO users (username, email, password, full_name, location, contact)
                     VALUES (?, ?, ?, ?, ?, ?)
-                """, (username, email, password, full_name, location, contact))
+                """, (username, email, hash_password(password), full_name, location, contact))
 
-                user_id = cursor.lastrowid
+                admin_user_id = cursor.lastrowid
 
                 # Add to admin table
-                add_user_to_admin(user_id, username, email, full_name)
+                add_user_to_admin(conn, admin_user_id, username, email, full_name)
                 message = "Admin user created successfully in both tables!"
-
-            return f"""
-            <div style="max-width: 600px; margin: 50px auto; padding: 20px; background: white; border-radius: 10px; text-align: center;">
-                <h2 style="color: #0d47a1;">✅ {message}</h2>
-                <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                    <p><strong>Username:</strong> {username}</p>
-                    <p><strong>Password:</strong> {password}</p>
-                    <p><strong>Email:</strong> {email}</p>
-                    <p><strong>Status:</strong> <span style="color: #4CAF50; font-weight: bold;">Administrator</span></p>
-                </div>
-                <a href='/login' style='display: inline-block; padding: 12px 24px; background: #0d47a1; color: white; text-decoration: none; border-radius: 6px; font-weight: bold;'>
-                    🚀 Login as Admin
-                </a>
-            </div>
-            """
-
-        except Exception as e:
-            return f"Error: {str(e)}"
-
-def is_admin_user():
-    """Check if current user is admin using admin_table"""
-    if 'user_id' not in session:
-        return False
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
-        admin = conn.execute(
-            "SELECT * FROM admin_table WHERE user_id = ? AND is_active = 1",
-            (session['user_id'],)
-        ).fetchone()
-        return admin is not None
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+    # Only once committed, so no other request re-caches the old role in between
+    invalidate_user_access(admin_user_id)
+
+    return f"""
+    <div style="max-width: 600px; margin: 50px auto; padding: 20px; background: white; border-radius: 10px; text-align: center;">
+        <h2 style="color: #0d47a1;">✅ {message}</h2>
+        <div style="background: #f8f9fa; padding: 15px; border-radius: 8px; margin: 20px 0;">
+            <p><strong>Username:</strong> {username}</p>
+            <p><strong>Password:</strong> {password}</p>
+            <p><strong>Email:</strong> {email}</p>
+            <p><strong>Status:</strong> <span style="color: #4CAF50; font-weight: bold;">Administrator</span></p>
+        </div>
+        <a href='/login' style='display: inline-block; padding: 12px 24px; background: #0d47a1; color: white; text-decoration: none; border-radius: 6px; font-weight: bold;'>
+            🚀 Login as Admin
+        </a>
+    </div>
+    """
 
 def get_admin_users():
     """Get all active admin users"""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         admins = conn.execute(
             "SELECT * FROM admin_table WHERE is_active = 1"
         ).fetchall()
         return admins
 
-def add_user_to_admin(user_id, username, email, full_name=None):
-    """Add a user to admin table"""
-    with sqlite3.connect(DB_NAME) as conn:
-        try:
-            conn.execute(
-                "INSERT INTO admin_table (user_id, username, email, full_name) VALUES (?, ?, ?, ?)",
-                (user_id, username, email, full_name)
-            )
-            return True
-        except sqlite3.IntegrityError:
-            return False
+def add_user_to_admin(conn, user_id, username, email, full_name=None):
+    """Add a user to admin table in the caller's transaction.
+
+    The caller commits, then calls invalidate_user_access(user_id).
+    """
+    try:
+        conn.execute(
+            "INSERT INTO admin_table (user_id, username, email, full_name) VALUES (?, ?, ?, ?)",
+            (user_id, username, email, full_name)
+        )
+    except sqlite3.IntegrityError:
+        return False
+    return True
 
 @app.route('/admin/ban_user', methods=['POST'])
 def ban_user():
@@ -2399,8 +3914,9 @@ def ban_user():
     reason = request.form['reason']
     duration = request.form['duration']
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         if duration == 'permanent':
+            banned_until = None
             conn.execute("""
                 INSERT INTO user_bans (user_id, admin_id, reason, is_permanent, is_active)
                 VALUES (?, ?, ?, 1, 1)
@@ -2411,7 +3927,8 @@ def ban_user():
             conn.execute("""
                 INSERT INTO user_bans (user_id, admin_id, reason, duration_days, banned_until, is_active)
                 VALUES (?, ?, ?, ?, ?, 1)
-            """, (user_id, session['user_id'], reason, duration, banned_until))
+            """, (user_id, session['user_id'], reason, duration, banned_until.isoformat(' ')))
+    ban_registry.ban(int(user_id), banned_until)
 
     flash('User has been banned.', 'success')
     return redirect(url_for('admin_dashboard'))
@@ -2424,11 +3941,12 @@ def unban_user(user_id):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute(
             "UPDATE user_bans SET is_active = 0 WHERE user_id = ? AND is_active = 1",
             (user_id,)
         )
+    ban_registry.lift(user_id)
 
     flash('User has been unbanned.', 'success')
     return redirect(url_for('admin_dashboard'))
@@ -2445,7 +3963,7 @@ def create_announcement():
     content = request.form['content']
     priority = request.form['priority']
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute("""
             INSERT INTO announcements (admin_id, title, content, priority)
             VALUES (?, ?, ?, ?)
@@ -2462,8 +3980,7 @@ def toggle_announcement(announcement_id):
         flash('Access denied.', 'error')
         return redirect(url_for('dashboard'))
 
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         announcement = conn.execute(
             "SELECT is_active FROM announcements WHERE id = ?",
             (announcement_id,)
@@ -2488,11 +4005,12 @@ def make_admin():
         flash('Please login first to become an admin.', 'warning')
         return redirect(url_for('login'))
 
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute(
             "UPDATE users SET is_admin = 1 WHERE id = ?",
             (session['user_id'],)
         )
+    invalidate_user_access(session['user_id'])
     flash('You are now an admin! Please logout and login again to see the Admin Panel.', 'success')
     return redirect(url_for('dashboard'))
 
@@ -2521,7 +4039,7 @@ def create_recommendations_table():
 
 def update_item_availability(item_id, available=True):
     """Update item availability status"""
-    with sqlite3.connect(DB_NAME) as conn:
+    with get_db() as conn:
         conn.execute(
             "UPDATE items SET item_available = ? WHERE items_id = ?",
             (1 if available else 0, item_id)
@@ -2529,8 +4047,7 @@ def update_item_availability(item_id, available=True):
 
 def get_item_availability(item_id):
     """Check if item is available for trading"""
-    with sqlite3.connect(DB_NAME) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_db() as conn:
         item = conn.execute(
             "SELECT item_available FROM items WHERE items_id = ?",
             (item_id,)
@@ -2629,10 +4146,677 @@ def create_admin_tables():
     except Exception as e:
         print(f"❌ Error creating admin tables: {e}")
 
+# =====================
+# ITEM IMPORT / EXPORT
+# =====================
+
+# Item columns a trader can bring in or take out, in file order
+ITEM_FILE_COLUMNS = ('item_Name', 'item_Brand', 'item_Condition', 'item_DateBought',
+                     'item_DateOffered', 'item_Description', 'item_image')
+ITEM_FILE_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+# Rows written per import transaction
+ITEM_IMPORT_BATCH_SIZE = 500
+# Per-row errors kept in an import report; any beyond this are only counted
+ITEM_IMPORT_MAX_ERRORS = 100
+# Rows fetched from the cursor per chunk of an export
+ITEM_EXPORT_CHUNK_SIZE = 500
+# Rows one uploaded file may hold; the import-items command has no limit
+app.config.setdefault('ITEM_IMPORT_MAX_ROWS', 10000)
+# Largest request body Flask will accept (413 beyond it); covers import files and image uploads
+app.config.setdefault('MAX_CONTENT_LENGTH', 16 * 1024 * 1024)
+
+
+def item_file_format(filename, requested=None):
+    """csv or jsonl, from an explicit choice or else the file extension"""
+    fmt = (requested or os.path.splitext(filename or '')[1].lstrip('.')).lower()
+    fmt = 'jsonl' if fmt == 'ndjson' else fmt
+    if fmt not in ITEM_FILE_MIMETYPES:
+        raise ValueError(f"Unsupported item file format '{fmt}', use csv or jsonl")
+    return fmt
+
+
+def read_item_file(stream, fmt):
+    """Yield (line_number, row, error) for each record of a binary CSV/JSONL stream, one at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, 'more values than header columns'
+            else:
+                yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, 'expected a JSON object'
+
+
+def item_row_values(row, offered_at):
+    """Validate one imported row and return its values in ITEM_FILE_COLUMNS order.
+
+    Columns outside ITEM_FILE_COLUMNS (an exported items_id, say) are ignored.
+    """
+    values = {}
+    for column in ITEM_FILE_COLUMNS:
+        value = row.get(column)
+        if value is None:
+            value = ''
+        elif isinstance(value, (dict, list)):
+            raise ValueError(f'{column} must be text')
+        values[column] = str(value).strip()
+
+    if not values['item_Name']:
+        raise ValueError('item_Name is required')
+    # Older items hold free-form dates, so only a parseable future date is rejected
+    try:
+        bought = datetime.strptime(values['item_DateBought'], '%Y-%m-%d').date()
+    except ValueError:
+        bought = None
+    if bought and bought > date.today():
+        raise ValueError('item_DateBought is in the future')
+    values['item_DateOffered'] = values['item_DateOffered'] or offered_at
+    return tuple(values[column] for column in ITEM_FILE_COLUMNS)
+
+
+def import_items(conn, user_id, stream, fmt, max_rows=None):
+    """Insert the valid rows of an item file for user_id, ITEM_IMPORT_BATCH_SIZE rows per transaction.
+
+    Rows are validated as they are read, so memory stays flat however large
+    the file is. Reading stops after max_rows rows, with an error for the row
+    that went over. Returns {'imported', 'failed', 'errors': [{'line', 'error'}]}.
+    """
+    now = datetime.now()
+    # Same wording the add item form fills in, e.g. "October 24, 2025 at 4:13 PM"
+    offered_at = f"{now:%B} {now.day}, {now.year} at {now.hour % 12 or 12}:{now:%M %p}"
+    insert = f"""
+        INSERT INTO items (user_id, {', '.join(ITEM_FILE_COLUMNS)})
+        VALUES (?{', ?' * len(ITEM_FILE_COLUMNS)})
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    def record_error(line_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < ITEM_IMPORT_MAX_ERRORS:
+            report['errors'].append({'line': line_number, 'error': error})
+
+    def flush():
+        with conn:
+            conn.executemany(insert, batch)
+        report['imported'] += len(batch)
+        batch.clear()
+
+    line_number = 0
+    try:
+        for rows_read, (line_number, row, error) in enumerate(read_item_file(stream, fmt), 1):
+            if max_rows is not None and rows_read > max_rows:
+                record_error(line_number, f'too many rows, import stopped: files are limited to {max_rows} rows')
+                break
+            if error is None:
+                try:
+                    batch.append((user_id,) + item_row_values(row, offered_at))
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                record_error(line_number, error)
+            elif len(batch) >= ITEM_IMPORT_BATCH_SIZE:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the file can't be read; keep the batches already written
+        record_error(line_number + 1, f'unreadable file, import stopped: {e}')
+
+    if batch:
+        flush()
+    return report
+
+
+def export_items(user_id, fmt):
+    """Yield user_id's items as CSV or JSONL text, streamed from the cursor a chunk at a time"""
+    columns = ('items_id',) + ITEM_FILE_COLUMNS
+    conn = checkout_db_connection()
+    try:
+        cursor = conn.execute(
+            f"SELECT {', '.join(columns)} FROM items WHERE user_id = ? ORDER BY items_id",
+            (user_id,)
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(columns)
+
+        for rows in iter(lambda: cursor.fetchmany(ITEM_EXPORT_CHUNK_SIZE), []):
+            for row in rows:
+                if fmt == 'csv':
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, row))) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    finally:
+        return_db_connection(conn)
+
+
+@app.route('/items/import', methods=['POST'])
+def import_items_upload():
+    """Bulk-add items from an uploaded CSV or JSONL file"""
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if 'user_id' not in session:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': 'Please login first'}), 401
+        flash('Please login first.', 'warning')
+        return redirect(url_for('login'))
+
+    if is_admin_user():
+        if wants_json:
+            return jsonify({'status': 'error', 'message': 'Administrators cannot add items for trade'}), 403
+        flash('Administrators cannot add items for trade.', 'error')
+        return redirect(url_for('dashboard'))
+
+    upload = request.files.get('items_file')
+    try:
+        if not upload or not upload.filename:
+            raise ValueError('Choose a CSV or JSONL file to import')
+        fmt = item_file_format(upload.filename, request.form.get('format'))
+    except ValueError as e:
+        if wants_json:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        flash(f'{e}.', 'error')
+        return redirect(url_for('dashboard'))
+
+    with get_db() as conn:
+        report = import_items(conn, session['user_id'], upload.stream, fmt, app.config['ITEM_IMPORT_MAX_ROWS'])
+
+    if wants_json:
+        return jsonify({'status': 'success', **report})
+
+    flash(f"Imported {report['imported']} item(s).", 'success' if report['imported'] else 'warning')
+    if report['failed']:
+        shown = '; '.join(f"line {e['line']}: {e['error']}" for e in report['errors'][:5])
+        flash(f"{report['failed']} row(s) skipped - {shown}", 'error')
+    return redirect(url_for('dashboard'))
+
+
+@app.errorhandler(413)
+def request_too_large(error):
+    """An upload over MAX_CONTENT_LENGTH"""
+    message = f"Uploads are limited to {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB."
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'error', 'message': message}), 413
+    flash(message, 'error')
+    return redirect(url_for('dashboard'))
+
+
+@app.route('/items/export')
+def export_items_download():
+    """Download the logged-in trader's items as CSV (default) or JSONL"""
+    if 'user_id' not in session:
+        flash('Please login first.', 'warning')
+        return redirect(url_for('login'))
+
+    try:
+        fmt = item_file_format(None, request.args.get('format', 'csv'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return Response(export_items(session['user_id'], fmt), mimetype=ITEM_FILE_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=barterzone-items.{fmt}'})
+
+
+def find_user_id(conn, username):
+    user = conn.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if not user:
+        raise click.ClickException(f"No user named '{username}'")
+    return user['id']
+
+
+@app.cli.command('import-items')
+@click.argument('username')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(sorted(ITEM_FILE_MIMETYPES)), help='Defaults to the file extension.')
+def import_items_command(username, path, fmt):
+    """Bulk-add items for USERNAME from a CSV or JSONL file."""
+    try:
+        fmt = item_file_format(path, fmt)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    with get_db() as conn, open(path, 'rb') as stream:
+        report = import_items(conn, find_user_id(conn, username), stream, fmt)
+
+    for error in report['errors']:
+        print(f"❌ line {error['line']}: {error['error']}")
+    print(f"✅ Imported {report['imported']} item(s) for {username}, {report['failed']} row(s) skipped")
+
+
+@app.cli.command('export-items')
+@click.argument('username')
+@click.option('--format', 'fmt', type=click.Choice(sorted(ITEM_FILE_MIMETYPES)), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+def export_items_command(username, fmt, output):
+    """Write USERNAME's items as CSV or JSONL."""
+    with get_db() as conn:
+        user_id = find_user_id(conn, username)
+    for chunk in export_items(user_id, fmt):
+        output.write(chunk)
+
+
+# =====================
+# PLATFORM STATS
+# =====================
+
+# Counters shown on the admin dashboards: (column, table, which rows count).
+# {row} is replaced by new/old in the triggers and by the table in reconcile.
+PLATFORM_COUNTERS = [
+    ('total_users', 'users', "1"),
+    ('total_traders', 'users', "COALESCE({row}.is_admin, 0) = 0"),
+    ('total_items', 'items', "1"),
+    ('active_trades', 'trades', "{row}.trade_status IN ('pending', 'accepted')"),
+    ('completed_trades', 'trades', "{row}.trade_status = 'completed'"),
+    ('pending_reports', 'user_reports', "{row}.status = 'pending'"),
+    ('pending_suggestions', 'user_recommendations', "{row}.status = 'pending'"),
+    ('active_bans', 'user_bans', "{row}.is_active = 1"),
+]
+
+
+def create_platform_stats():
+    """Create the platform_stats counters row and the triggers that keep it current"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            columns = ",\n".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column, _, _ in PLATFORM_COUNTERS)
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS platform_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    {columns},
+                    reconciled_at TIMESTAMP
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO platform_stats (id) VALUES (1)")
+
+            tables = {}
+            for column, table, condition in PLATFORM_COUNTERS:
+                tables.setdefault(table, []).append((column, condition))
+
+            for table, counters in tables.items():
+                inserted = ", ".join(f"{c} = {c} + ({cond.format(row='new')})" for c, cond in counters)
+                deleted = ", ".join(f"{c} = {c} - ({cond.format(row='old')})" for c, cond in counters)
+                updated = ", ".join(
+                    f"{c} = {c} + ({cond.format(row='new')}) - ({cond.format(row='old')})" for c, cond in counters
+                )
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS platform_stats_{table}_insert AFTER INSERT ON {table}
+                    BEGIN UPDATE platform_stats SET {inserted} WHERE id = 1; END
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS platform_stats_{table}_delete AFTER DELETE ON {table}
+                    BEGIN UPDATE platform_stats SET {deleted} WHERE id = 1; END
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS platform_stats_{table}_update AFTER UPDATE ON {table}
+                    BEGIN UPDATE platform_stats SET {updated} WHERE id = 1; END
+                """)
+            print("✅ Platform stats counters ready")
+    except Exception as e:
+        print(f"❌ Error creating platform stats: {e}")
+
+
+def reconcile_platform_stats():
+    """Recount every platform stat from its table, fix any drift and report it"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            conn.row_factory = sqlite3.Row
+            before = conn.execute("SELECT * FROM platform_stats WHERE id = 1").fetchone()
+
+            # One statement, so the recount and the write see the same snapshot
+            recounts = ", ".join(
+                f"{column} = (SELECT COUNT(*) FROM {table} WHERE {condition.format(row=table)})"
+                for column, table, condition in PLATFORM_COUNTERS
+            )
+            conn.execute(f"UPDATE platform_stats SET {recounts}, reconciled_at = CURRENT_TIMESTAMP WHERE id = 1")
+            after = conn.execute("SELECT * FROM platform_stats WHERE id = 1").fetchone()
+
+        drift = {column: after[column] - before[column]
+                 for column, _, _ in PLATFORM_COUNTERS if before and after[column] != before[column]}
+        if drift:
+            print(f"🔄 Platform stats reconciled, corrected drift: {drift}")
+        return drift
+    except Exception as e:
+        print(f"❌ Error reconciling platform stats: {e}")
+        return None
+
+
+def get_platform_stats(conn):
+    """Read the platform counters in one row"""
+    return conn.execute("SELECT * FROM platform_stats WHERE id = 1").fetchone()
+
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recount platform_stats from the underlying tables."""
+    drift = reconcile_platform_stats()
+    print(f"✅ Platform stats reconciled ({len(drift or {})} counter(s) corrected)")
+
+
+# =====================
+# USER REPUTATION
+# =====================
+# One user_reputation row per rated or trading user, updated in the same
+# transaction as the rating or trade completion it counts, so /ratings and
+# /get_user_rating_stats read a row instead of aggregating user_ratings and trades.
+
+STAR_COLUMNS = {5: 'five_star', 4: 'four_star', 3: 'three_star', 2: 'two_star', 1: 'one_star'}
+
+
+def create_user_reputation():
+    """Create the user_reputation table, backfilling it the first time"""
+    try:
+        with sqlite3.connect(DB_NAME) as conn:
+            stars = ",\n".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in STAR_COLUMNS.values())
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS user_reputation (
+                    user_id INTEGER PRIMARY KEY,
+                    rating_sum INTEGER NOT NULL DEFAULT 0,
+                    rating_count INTEGER NOT NULL DEFAULT 0,
+                    {stars},
+                    completed_trades INTEGER NOT NULL DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
+            empty = conn.execute("SELECT NOT EXISTS(SELECT 1 FROM user_reputation)").fetchone()[0]
+        if empty:
+            rebuild_user_reputation()
+        print("✅ User reputation table ready")
+    except Exception as e:
+        print(f"❌ Error creating user reputation: {e}")
+
+
+def rebuild_user_reputation():
+    """Recompute every user_reputation row from user_ratings and trades; returns the row count"""
+    stars = ", ".join(f"SUM(rating = {star}) AS {column}" for star, column in STAR_COLUMNS.items())
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.execute("DELETE FROM user_reputation")
+        # Ratings and completed trades are counted separately and then joined, one row each per user
+        conn.execute(f"""
+            INSERT INTO user_reputation (user_id, rating_sum, rating_count, {", ".join(STAR_COLUMNS.values())}, completed_trades)
+            SELECT u.id, COALESCE(r.rating_sum, 0), COALESCE(r.rating_count, 0),
+                   {", ".join(f"COALESCE(r.{column}, 0)" for column in STAR_COLUMNS.values())},
+                   COALESCE(t.completed_trades, 0)
+            FROM users u
+            LEFT JOIN (
+                SELECT rated_user_id, SUM(rating) AS rating_sum, COUNT(*) AS rating_count, {stars}
+                FROM user_ratings
+                GROUP BY rated_user_id
+            ) r ON r.rated_user_id = u.id
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS completed_trades FROM (
+                    SELECT offer_user_id AS user_id FROM trades WHERE trade_status = 'completed'
+                    UNION ALL
+                    SELECT target_user_id FROM trades WHERE trade_status = 'completed'
+                ) GROUP BY user_id
+            ) t ON t.user_id = u.id
+            WHERE r.rated_user_id IS NOT NULL OR t.user_id IS NOT NULL
+        """)
+        return conn.execute("SELECT COUNT(*) FROM user_reputation").fetchone()[0]
+
+
+def record_rating(conn, rated_user_id, rating):
+    """Add a new rating to the rated user's reputation"""
+    star_column = STAR_COLUMNS[rating]
+    conn.execute(f"""
+        INSERT INTO user_reputation (user_id, rating_sum, rating_count, {star_column})
+        VALUES (?, ?, 1, 1)
+        ON CONFLICT (user_id) DO UPDATE SET
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_count = rating_count + 1,
+            {star_column} = {star_column} + 1
+    """, (rated_user_id, rating))
+
+
+def record_completed_trade(conn, trade):
+    """Count a newly completed trade for both traders"""
+    conn.executemany("""
+        INSERT INTO user_reputation (user_id, completed_trades) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET completed_trades = completed_trades + 1
+    """, [(trade['offer_user_id'],), (trade['target_user_id'],)])
+
+
+def get_user_reputation(conn, user_id):
+    """A user's reputation row as a dict, all zeros if they have none yet"""
+    row = conn.execute("SELECT * FROM user_reputation WHERE user_id = ?", (user_id,)).fetchone()
+    reputation = dict(row) if row else {
+        'user_id': user_id, 'rating_sum': 0, 'rating_count': 0, 'completed_trades': 0,
+        **{column: 0 for column in STAR_COLUMNS.values()},
+    }
+    reputation['average_rating'] = (
+        reputation['rating_sum'] / reputation['rating_count'] if reputation['rating_count'] else None
+    )
+    return reputation
+
+
+@app.cli.command('rebuild-reputation')
+def rebuild_reputation_command():
+    """Recompute user_reputation from user_ratings and trades."""
+    count = rebuild_user_reputation()
+    print(f"✅ Rebuilt reputation for {count} user(s)")
+
+
+# =====================
+# LIVE EVENTS
+# =====================
+# Events are written to user_events in the same transaction as the change they
+# describe, so a stream in any worker process can pick them up. The in-process
+# broker only wakes this process's streams early; streams in other workers see
+# the row on their next poll of the table (EVENT_POLL_SECONDS).
+app.config.setdefault('EVENT_POLL_SECONDS', 5)
+app.config.setdefault('EVENT_STREAM_SECONDS', 300)
+app.config.setdefault('EVENT_RETENTION_HOURS', 24)
+EVENT_BATCH_SIZE = 100
+
+
+class EventBroker:
+    """In-process wake-up signal for users with new rows in user_events"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = {}
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Also call listener(user_ids) on every notify, e.g. to wake asyncio waiters"""
+        self._listeners.append(listener)
+
+    def notify(self, user_ids):
+        with self._condition:
+            for user_id in user_ids:
+                self._sequence[user_id] = self._sequence.get(user_id, 0) + 1
+            self._condition.notify_all()
+        for listener in self._listeners:
+            listener(user_ids)
+
+    def sequence(self, user_id):
+        with self._condition:
+            return self._sequence.get(user_id, 0)
+
+    def wait(self, user_id, seen, timeout):
+        """Block until user_id is notified past seen or timeout passes; return the current sequence"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence.get(user_id, 0) != seen, timeout)
+            return self._sequence.get(user_id, 0)
+
+
+event_broker = EventBroker()
+
+
+def publish_event(conn, user_ids, event_type, payload):
+    """Record an event for each user as part of the caller's transaction"""
+    user_ids = {int(user_id) for user_id in user_ids}
+    data = json.dumps(payload)
+    conn.executemany(
+        "INSERT INTO user_events (user_id, event_type, payload) VALUES (?, ?, ?)",
+        [(user_id, event_type, data) for user_id in user_ids]
+    )
+    g.setdefault('event_user_ids', set()).update(user_ids)
+
+
+def fetch_trade_status(conn, trade_id):
+    """Current trade and arrangement status of a trade, or None"""
+    return conn.execute("""
+        SELECT t.trade_id, t.offer_user_id, t.target_user_id, t.trade_status, t.version,
+               ta.status AS arrangement_status,
+               ta.user1_confirmed_details, ta.user2_confirmed_details,
+               ta.user1_confirmed_receipt, ta.user2_confirmed_receipt
+        FROM trades t
+        LEFT JOIN trade_arrangements ta ON ta.trade_id = t.trade_id
+        WHERE t.trade_id = ?
+    """, (trade_id,)).fetchone()
+
+
+def publish_trade_status(conn, trade_id):
+    """Send both parties of a trade its current trade and arrangement status"""
+    status = fetch_trade_status(conn, trade_id)
+    if status:
+        publish_event(conn, (status['offer_user_id'], status['target_user_id']), 'trade_status', dict(status))
+
+
+@app.after_request
+def notify_event_streams(response):
+    """Wake this process's streams for users that got events during the request"""
+    user_ids = g.pop('event_user_ids', None)
+    if user_ids:
+        event_broker.notify(user_ids)
+    return response
+
+
+def read_user_events(user_id, after_id):
+    """Next batch of a user's events, on a pooled connection held only for the query"""
+    conn = checkout_db_connection()
+    try:
+        return conn.execute("""
+            SELECT id, event_type, payload FROM user_events
+            WHERE user_id = ? AND id > ?
+            ORDER BY id LIMIT ?
+        """, (user_id, after_id, EVENT_BATCH_SIZE)).fetchall()
+    finally:
+        return_db_connection(conn)
+
+
+def stream_user_events(user_id, last_id):
+    """Yield SSE frames for user_id until EVENT_STREAM_SECONDS pass; the browser then reconnects"""
+    deadline = time.monotonic() + app.config['EVENT_STREAM_SECONDS']
+    yield "retry: 3000\n\n"
+
+    while time.monotonic() < deadline:
+        seen = event_broker.sequence(user_id)
+        events = read_user_events(user_id, last_id)
+        for event in events:
+            last_id = event['id']
+            yield f"id: {event['id']}\nevent: {event['event_type']}\ndata: {event['payload']}\n\n"
+        if len(events) == EVENT_BATCH_SIZE:
+            continue
+
+        if event_broker.wait(user_id, seen, app.config['EVENT_POLL_SECONDS']) == seen:
+            yield ": keepalive\n\n"
+
+
+@app.route('/events')
+def event_stream():
+    """Server-Sent Events stream of the logged-in user's chat and trade updates"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'message': 'Please login first'}), 401
+
+    user_id = session['user_id']
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', ''))
+
+    if last_event_id.isdigit():
+        last_id = int(last_event_id)
+    else:
+        # A fresh page already shows current state; only stream what happens next
+        with get_db() as conn:
+            last_id = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM user_events WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()[0]
+
+    return Response(stream_user_events(user_id, last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def prune_user_events():
+    """Drop delivered events older than EVENT_RETENTION_HOURS"""
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.execute(
+            "DELETE FROM user_events WHERE created_at < datetime('now', ?)",
+            (f"-{app.config['EVENT_RETENTION_HOURS']} hours",)
+        )
+
+
+# =====================
+# BACKGROUND JOBS
+# =====================
+
+def start_background_job(name, interval_seconds, job):
+    """Run job every interval_seconds on a daemon thread (0 disables it)"""
+    if not interval_seconds:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                job()
+            except Exception as e:
+                print(f"❌ Background job {name} failed: {e}")
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+app.config.setdefault('PLATFORM_STATS_RECONCILE_SECONDS',
+                      int(os.environ.get('BARTERZONE_STATS_RECONCILE_SECONDS', 3600)))
+
+# =====================
+# STARTUP
+# =====================
+# Ensure DB exists
+if not os.path.exists(DB_NAME):
+    init_db()
+
+SQLITE_PROFILE = configure_database()
+create_recommendations_table()
+create_admin_tables()
+add_item_lock_column()
+add_trade_version_column()
+add_item_updated_at_column()
+create_indexes()
+create_search_index()
+create_catalogue_version()
+create_conversations_table()
+create_user_events_table()
+create_platform_stats()
+reconcile_platform_stats()
+create_user_reputation()
+prepare_dummy_password_hash()
+start_thumbnail_worker()
+sweep_expired_bans()
+
+start_background_job('reconcile-platform-stats', app.config['PLATFORM_STATS_RECONCILE_SECONDS'],
+                     reconcile_platform_stats)
+start_background_job('prune-user-events', 3600, prune_user_events)
+start_background_job('sweep-expired-bans', app.config['BAN_SWEEP_SECONDS'], sweep_expired_bans)
+
 # =====================
 # RUN APP
 # =====================
 if __name__ == '__main__':
-    create_recommendations_table()
-    create_admin_tables()
     app.run(debug=True)
@@ -0,0 +1,279 @@
+"""ASGI entry point for serving BarterZone with many idle live connections.
+
+    pip install asgiref uvicorn
+    uvicorn asgi:application
+
+The live endpoints are handled here on the event loop, so an open stream costs a
+coroutine rather than a worker thread:
+
+    /events                            Server-Sent Events stream
+    /chat/<partner_id>/messages?wait=  long-poll for new chat messages
+    /trade/<trade_id>/status?wait=     long-poll for a trade status change
+
+Database reads go through a small bounded thread pool. Every other request,
+and the long-polls once something happened (or they time out), is passed to
+the unchanged Flask app through asgiref's WSGI adapter. Flask's enforce_bans
+hook never sees the live endpoints, so they check app.ban_registry themselves:
+on connect, and again between polls so an open stream closes within
+EVENT_POLL_SECONDS of a ban.
+"""
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from app import (app, event_broker, read_user_events, checkout_db_connection, return_db_connection,
+                 ban_registry, ban_message)
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:
+    raise ImportError("asgi.py needs asgiref: pip install asgiref uvicorn") from None
+
+# Threads for SQLite reads made by the async handlers; waiting subscribers hold none
+DB_THREADS = int(os.environ.get('BARTERZONE_ASYNC_DB_THREADS', 8))
+# Longest a long-poll request may ask to wait
+MAX_LONG_POLL_SECONDS = 30
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='asgi-db')
+flask_app = WsgiToAsgi(app)
+
+CHAT_MESSAGES_PATH = re.compile(r'^/chat/(\d+)/messages$')
+TRADE_STATUS_PATH = re.compile(r'^/trade/(\d+)/status$')
+
+
+class AsyncEventHub:
+    """Wakes coroutines waiting on a user's events when app.event_broker is notified"""
+
+    def __init__(self):
+        self.loop = None
+        self.waiters = {}
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            event_broker.add_listener(self.notify)
+
+    def notify(self, user_ids):
+        # Called from the request thread that published the events
+        self.loop.call_soon_threadsafe(self._wake, list(user_ids))
+
+    def _wake(self, user_ids):
+        for user_id in user_ids:
+            for waiter in self.waiters.pop(user_id, ()):
+                waiter.set()
+
+    def waiter(self, user_id):
+        waiter = asyncio.Event()
+        self.waiters.setdefault(user_id, set()).add(waiter)
+        return waiter
+
+    def discard(self, user_id, waiter):
+        waiters = self.waiters.get(user_id)
+        if waiters:
+            waiters.discard(waiter)
+            if not waiters:
+                del self.waiters[user_id]
+
+
+hub = AsyncEventHub()
+
+
+async def run_db(func, *args):
+    """Run a blocking database call on the bounded pool"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, func, *args)
+
+
+def latest_event_id(user_id):
+    """Id of the user's newest event, 0 if none"""
+    conn = checkout_db_connection()
+    try:
+        return conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM user_events WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+    finally:
+        return_db_connection(conn)
+
+
+async def next_user_events(user_id, last_id, timeout):
+    """Events after last_id, waiting up to timeout seconds for some to arrive.
+
+    The hub wakes us for events published in this process; the poll interval
+    bounds how late we see events written by other worker processes.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        waiter = hub.waiter(user_id)
+        try:
+            events = await run_db(read_user_events, user_id, last_id)
+            remaining = deadline - loop.time()
+            if events or remaining <= 0:
+                return events
+            try:
+                await asyncio.wait_for(waiter.wait(), min(remaining, app.config['EVENT_POLL_SECONDS']))
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            hub.discard(user_id, waiter)
+
+
+def has_new_chat_messages(user_id, partner_id, after):
+    """Whether the pair has messages newer than after"""
+    conn = checkout_db_connection()
+    try:
+        return conn.execute("""
+            SELECT 1 FROM trade_messages WHERE sender_id = ? AND receiver_id = ? AND message_id > ?
+            UNION ALL
+            SELECT 1 FROM trade_messages WHERE sender_id = ? AND receiver_id = ? AND message_id > ?
+            LIMIT 1
+        """, (user_id, partner_id, after, partner_id, user_id, after)).fetchone() is not None
+    finally:
+        return_db_connection(conn)
+
+
+def session_user_id(scope):
+    """Logged-in user id from the Flask session cookie, or None"""
+    headers = dict(scope['headers'])
+    cookie = SimpleCookie()
+    cookie.load(headers.get(b'cookie', b'').decode('latin-1'))
+    morsel = cookie.get(app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return None
+
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        data = serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return None
+    return data.get('user_id')
+
+
+async def send_json_error(send, status, message):
+    body = json.dumps({'status': 'error', 'message': message}).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_for_disconnect(receive):
+    """Drain the request until the client goes away"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(scope, receive, send, user_id):
+    """Async twin of app.event_stream: same frames, no thread held while idle.
+
+    Unlike the WSGI stream it runs until the client disconnects, since an idle
+    stream here costs no thread.
+    """
+    headers = dict(scope['headers'])
+    query = parse_qs(scope['query_string'].decode())
+    last_event_id = headers.get(b'last-event-id', b'').decode() or query.get('last_event_id', [''])[0]
+    last_id = int(last_event_id) if last_event_id.isdigit() else await run_db(latest_event_id, user_id)
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+    await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        # Flask's enforce_bans never sees this stream, so close it here once a ban lands
+        while not disconnected.done() and not ban_registry.is_banned(user_id):
+            fetch = asyncio.ensure_future(next_user_events(user_id, last_id, app.config['EVENT_POLL_SECONDS']))
+            await asyncio.wait({fetch, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not fetch.done():
+                fetch.cancel()
+                break
+
+            events = fetch.result()
+            frames = ''.join(
+                f"id: {event['id']}\nevent: {event['event_type']}\ndata: {event['payload']}\n\n"
+                for event in events
+            ) or ": keepalive\n\n"
+            if events:
+                last_id = events[-1]['id']
+            await send({'type': 'http.response.body', 'body': frames.encode(), 'more_body': True})
+        if not disconnected.done():
+            # Banned mid-stream: end the response; the reconnect is refused with a 403
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+
+
+async def wait_for_event(user_id, wait, event_type, matches):
+    """Wait up to wait seconds for a new event of event_type whose payload satisfies matches"""
+    last_id = await run_db(latest_event_id, user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+
+    while loop.time() < deadline and not ban_registry.is_banned(user_id):
+        # Wake at least every poll interval so a ban ends the wait promptly
+        events = await next_user_events(user_id, last_id,
+                                        min(deadline - loop.time(), app.config['EVENT_POLL_SECONDS']))
+        if events:
+            last_id = events[-1]['id']
+        if any(event['event_type'] == event_type and matches(json.loads(event['payload'])) for event in events):
+            return
+
+
+async def application(scope, receive, send):
+    """Route live endpoints to the async handlers and everything else to Flask"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                hub.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                db_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http' or scope['method'] != 'GET':
+        return await flask_app(scope, receive, send)
+
+    path = scope['path']
+    query = parse_qs(scope['query_string'].decode())
+    chat_match = CHAT_MESSAGES_PATH.match(path)
+    status_match = TRADE_STATUS_PATH.match(path)
+    wants_wait = 'wait' in query and (chat_match or status_match)
+
+    if path != '/events' and not wants_wait:
+        return await flask_app(scope, receive, send)
+
+    hub.start()
+    user_id = session_user_id(scope)
+    if user_id is None:
+        return await send_json_error(send, 401, 'Please login first')
+    if ban_registry.is_banned(user_id):
+        return await send_json_error(send, 403, ban_message(user_id))
+
+    if path == '/events':
+        return await stream_events(scope, receive, send, user_id)
+
+    try:
+        wait = min(max(float(query['wait'][0]), 0), MAX_LONG_POLL_SECONDS)
+    except ValueError:
+        wait = 0
+
+    if chat_match:
+        # ?after=<id>&wait=<s>: answer at once if the client is behind, else wait for the next message
+        partner_id = int(chat_match.group(1))
+        after = query.get('after', [''])[0]
+        if after.isdigit() and not await run_db(has_new_chat_messages, user_id, partner_id, int(after)):
+            await wait_for_event(user_id, wait, 'chat_message',
+                                 lambda message: partner_id in (message['sender_id'], message['receiver_id']))
+    else:
+        # ?wait=<s>: wait for the next change to this trade
+        trade_id = int(status_match.group(1))
+        await wait_for_event(user_id, wait, 'trade_status', lambda status: status['trade_id'] == trade_id)
+
+    await flask_app(scope, receive, send)
@@ -0,0 +1,93 @@
+"""Measure login throughput at each password hashing cost.
+
+    python bench_login.py [--seconds 5] [--clients 8]
+
+Runs against a throwaway database in a temporary directory. For every cost
+setting below it stores a user hashed at that cost, then has --clients
+threads log in through the Flask test client for --seconds, and reports
+logins/sec next to the time one hash takes. Pick the highest cost whose
+logins/sec still covers your peak login rate.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (label, config overrides) in increasing cost
+COST_SETTINGS = [
+    ('pbkdf2_sha256 100k', {'PASSWORD_HASHER': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 100000}),
+    ('pbkdf2_sha256 390k', {'PASSWORD_HASHER': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 390000}),
+    ('scrypt n=2^13', {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 13}),
+    ('scrypt n=2^14', {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 14}),
+    ('scrypt n=2^15', {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 15}),
+]
+
+
+def bench_setting(app, app_module, label, overrides, seconds, clients):
+    app.config.update(overrides)
+    username = 'bench_' + label.replace(' ', '_').replace('=', '').replace('^', '_')
+
+    started = time.perf_counter()
+    stored = app_module.hash_password('bench-password')
+    hash_ms = (time.perf_counter() - started) * 1000
+
+    with sqlite3.connect(app_module.DB_NAME) as conn:
+        conn.execute("DELETE FROM users WHERE username = ?", (username,))
+        conn.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
+                     (username, username + '@bench', stored))
+
+    logins = [0] * clients
+    failures = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(index):
+        test_client = app.test_client()
+        while time.perf_counter() < deadline:
+            response = test_client.post('/login', data={'username': username, 'password': 'bench-password'})
+            if response.status_code == 302:
+                logins[index] += 1
+            else:
+                failures[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    rate = sum(logins) / elapsed
+    print(f"{label:<22} {hash_ms:>9.1f} ms {rate:>12.1f}/s {sum(failures):>9}")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5, help='how long to log in at each cost')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent login threads')
+    args = parser.parse_args()
+
+    # app.py works on barterzone.db in the current directory, so run it in a scratch one
+    os.chdir(tempfile.mkdtemp(prefix='barterzone-bench-'))
+    sys.path.insert(0, REPO_DIR)
+    import app as app_module
+    app = app_module.app
+
+    print(f"\n{args.clients} clients, {args.seconds:g}s per setting, "
+          f"{app.config['PASSWORD_HASH_THREADS']} hashing threads on {os.cpu_count()} CPUs\n")
+    print(f"{'setting':<22} {'one hash':>12} {'logins':>13} {'failures':>9}")
+    for label, overrides in COST_SETTINGS:
+        if overrides['PASSWORD_HASHER'] == 'scrypt' and not hasattr(app_module.hashlib, 'scrypt'):
+            print(f"{label:<22} {'scrypt not available in this Python':>36}")
+            continue
+        bench_setting(app, app_module, label, overrides, args.seconds, args.clients)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Minify and fingerprint the stylesheets, scripts and images under static/.
+
+    python build_assets.py
+
+Each file is written to static/dist/ with a hash of its content in the name
+(css/base.css -> css/base.3f2a9c1be07d.css), and static/dist/manifest.json maps
+source names to built ones. app.asset_url() reads the manifest, so templates
+pick up the new names as soon as the build finishes, and app.py serves
+everything under static/dist/ with an immutable one-year Cache-Control.
+Without a build the app serves the unminified sources. Files from earlier
+builds are kept so pages rendered before a rebuild still load; delete
+static/dist to clear them.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = 'dist'
+MINIFIED = ('.css', '.js')
+COPIED = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.ico')
+
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+CSS_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+CSS_URL = re.compile(r'''url\(\s*(["']?)/static/([^"')]+)\1\s*\)''')
+# Punctuation that can only follow an operator, where a / starts a regex, not a division
+JS_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw')
+
+
+def minify_css(source):
+    """Drop comments and collapse whitespace, leaving quoted strings alone"""
+    parts = CSS_STRING.split(CSS_COMMENT.sub('', source))
+    for i in range(0, len(parts), 2):
+        code = re.sub(r'\s+', ' ', parts[i])
+        code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+        code = re.sub(r':\s+', ':', code)
+        parts[i] = code.replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+
+def regex_allowed(out):
+    """Whether a / at this point of the output starts a regex literal"""
+    text = ''.join(out[-12:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in JS_REGEX_PREFIX:
+        return True
+    return re.search(r'(?:^|[^\w$.])(' + '|'.join(JS_REGEX_KEYWORDS) + r')$', text) is not None
+
+
+def minify_js(source):
+    """Remove comments, indentation and blank lines from a script.
+
+    Deliberately conservative: line breaks are kept so automatic semicolon
+    insertion behaves exactly as before, and strings, template literals and
+    regex literals are copied untouched.
+    """
+    out = []
+    templates = []  # brace depth at each open ${ ... } inside a template literal
+    depth = 0
+    i, n = 0, len(source)
+
+    def copy_template(i):
+        # Copy template literal text up to its closing ` or the next ${
+        while i < n:
+            ch = source[i]
+            if ch == '\\':
+                out.append(source[i:i + 2])
+                i += 2
+            elif ch == '`':
+                out.append(ch)
+                return i + 1
+            elif source.startswith('${', i):
+                out.append('${')
+                templates.append(depth)
+                return i + 2
+            else:
+                out.append(ch)
+                i += 1
+        return i
+
+    while i < n:
+        ch = source[i]
+        if ch in '\r\n':
+            while out and out[-1] in (' ', '\t'):
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            while i < n and source[i] in ' \t\r\n':
+                i += 1
+        elif ch in ' \t':
+            if out and out[-1] not in (' ', '\n'):
+                out.append(' ')
+            while i < n and source[i] in ' \t':
+                i += 1
+        elif source.startswith('//', i):
+            while i < n and source[i] not in '\r\n':
+                i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            out.append('\n' if '\n' in source[i:end] else ' ')
+            i = end
+        elif ch in '"\'':
+            start = i
+            i += 1
+            while i < n and source[i] != ch and source[i] != '\n':
+                i += 2 if source[i] == '\\' else 1
+            out.append(source[start:i + 1])
+            i += 1
+        elif ch == '`':
+            out.append(ch)
+            i = copy_template(i + 1)
+        elif ch == '/' and regex_allowed(out):
+            start = i
+            i += 1
+            in_class = False
+            while i < n and source[i] != '\n':
+                if source[i] == '\\':
+                    i += 2
+                    continue
+                if source[i] == '[':
+                    in_class = True
+                elif source[i] == ']':
+                    in_class = False
+                elif source[i] == '/' and not in_class:
+                    break
+                i += 1
+            i += 1
+            while i < n and (source[i].isalnum() or source[i] == '_'):
+                i += 1
+            out.append(source[start:i])
+        elif ch == '}' and templates and templates[-1] == depth:
+            templates.pop()
+            out.append(ch)
+            i = copy_template(i + 1)
+        else:
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+            out.append(ch)
+            i += 1
+
+    return ''.join(out).strip() + '\n'
+
+
+def fingerprint(path, content):
+    """css/base.css -> css/base.<first 12 hex digits of the SHA-256>.css"""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}"
+
+
+def source_files(static_dir, extensions):
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if not (root == static_dir and d == DIST_DIR))
+        for filename in sorted(files):
+            if filename.lower().endswith(extensions):
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+
+def build(static_dir=STATIC_DIR):
+    """Rebuild static/dist and its manifest; returns the manifest"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest = {}
+    outputs = {}
+
+    # Images first, so stylesheets can point at their fingerprinted names
+    for name, path in source_files(static_dir, COPIED):
+        with open(path, 'rb') as f:
+            content = f.read()
+        manifest[name] = fingerprint(name, content)
+        outputs[manifest[name]] = content
+
+    def built_url(match):
+        built = manifest.get(match.group(2))
+        return f'url("/static/{DIST_DIR}/{built}")' if built else match.group(0)
+
+    for name, path in source_files(static_dir, MINIFIED):
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        if name.endswith('.css'):
+            text = CSS_URL.sub(built_url, minify_css(source))
+        else:
+            text = minify_js(source)
+        content = text.encode('utf-8')
+        manifest[name] = fingerprint(name, content)
+        outputs[manifest[name]] = content
+        print(f"✅ {name} -> {DIST_DIR}/{manifest[name]} ({len(source.encode('utf-8'))} -> {len(content)} bytes)")
+
+    # Names are content hashes, so existing files are already right. Older builds
+    # stay in place for pages rendered before this one; the manifest goes last.
+    for built, content in outputs.items():
+        target = os.path.join(dist_dir, *built.split('/'))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target + '.tmp', 'wb') as f:
+                f.write(content)
+            os.replace(target + '.tmp', target)
+
+    manifest_path = os.path.join(dist_dir, 'manifest.json')
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+if __name__ == '__main__':
+    manifest = build(sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR)
+    print(f"\n🎉 Built {len(manifest)} asset(s) into static/{DIST_DIR}")
@@ -0,0 +1,63 @@
+import sqlite3
+import sys
+
+DB_NAME = "barterzone.db"
+
+# The lookups app.py runs on every page view. Each one must be answered from an
+# index; a plain "SCAN <table>" in its plan means a secondary index is missing.
+HOT_QUERIES = [
+    ("items by owner",
+     "SELECT * FROM items WHERE user_id = ?", (1,)),
+    ("trades touching an item",
+     """SELECT trade_id FROM trades
+        WHERE (offer_item_id = ? OR target_item_id = ?)
+        AND trade_status IN ('pending', 'accepted')""", (1, 1)),
+    ("trades of a trader",
+     "SELECT * FROM trades WHERE offer_user_id = ? OR target_user_id = ?", (1, 1)),
+    ("chat history between two traders",
+     """SELECT * FROM trade_messages
+        WHERE (sender_id = ? AND receiver_id = ?) OR (sender_id = ? AND receiver_id = ?)""", (1, 2, 2, 1)),
+    ("chat page between two traders",
+     """SELECT message_id FROM trade_messages
+        WHERE sender_id = ? AND receiver_id = ? AND message_id < ?
+        ORDER BY message_id DESC LIMIT 50""", (1, 2, 100)),
+    ("messages of a trader",
+     "SELECT * FROM trade_messages WHERE sender_id = ? OR receiver_id = ?", (1, 1)),
+    ("inbox of a trader",
+     """SELECT user_high_id FROM conversations WHERE user_low_id = ?
+        UNION ALL
+        SELECT user_low_id FROM conversations WHERE user_high_id = ?""", (1, 1)),
+    ("arrangement of a trade",
+     "SELECT * FROM trade_arrangements WHERE trade_id = ?", (1,)),
+    ("negotiation messages of a trade",
+     "SELECT * FROM trade_messages_negotiation WHERE trade_id = ? ORDER BY created_at ASC", (1,)),
+    ("ratings of a trader",
+     "SELECT AVG(rating), COUNT(*) FROM user_ratings WHERE rated_user_id = ?", (1,)),
+    ("reports against a trader",
+     "SELECT COUNT(*) FROM user_reports WHERE reported_user_id = ?", (1,)),
+    ("active bans of a trader",
+     "SELECT COUNT(*) FROM user_bans WHERE user_id = ? AND is_active = 1", (1,)),
+]
+
+
+def check_query_plans(db_name=DB_NAME):
+    """Run EXPLAIN QUERY PLAN on each hot query and return the ones that fall back to a SCAN"""
+    failures = []
+    with sqlite3.connect(db_name) as conn:
+        for label, sql, params in HOT_QUERIES:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            scans = [step for step in plan if step.startswith("SCAN ")]
+            if scans:
+                print(f"❌ {label}: {'; '.join(scans)}")
+                failures.append(label)
+            else:
+                print(f"✅ {label}: {'; '.join(plan)}")
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check_query_plans(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
+    if failures:
+        print(f"\n❌ {len(failures)} hot quer{'y' if len(failures) == 1 else 'ies'} fell back to a full scan")
+        sys.exit(1)
+    print("\n🎉 All hot queries use an index")
@@ -39,7 +39,9 @@ def create_complete_database():
             item_Description TEXT,
             item_image TEXT,
             item_available BOOLEAN DEFAULT 1,
+            locked_by_trade_id INTEGER,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )''')
     print("✅ Items table created")
@@ -70,6 +72,7 @@ def create_complete_database():
             delivery_courier TEXT,
             tracking_number TEXT,
             cancellation_reason TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
             FOREIGN KEY (offer_user_id) REFERENCES users (id),
             FOREIGN KEY (target_user_id) REFERENCES users (id),
             FOREIGN KEY (offer_item_id) REFERENCES items (items_id),
@@ -240,6 +243,26 @@ def create_complete_database():
         )''')
     print("✅ User bans table created")
 
+    # =====================
+    # SECONDARY INDEXES
+    # =====================
+    c.execute("CREATE INDEX IF NOT EXISTS idx_items_user_id ON items (user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_items_locked_by_trade_id ON items (locked_by_trade_id)")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_items_free_by_user ON items (user_id)
+                 WHERE item_available = 1 AND locked_by_trade_id IS NULL""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_offer_item_id ON trades (offer_item_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_target_item_id ON trades (target_item_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_offer_user_id ON trades (offer_user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_target_user_id ON trades (target_user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trade_messages_sender_receiver ON trade_messages (sender_id, receiver_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trade_messages_receiver_sender ON trade_messages (receiver_id, sender_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trade_arrangements_trade_id ON trade_arrangements (trade_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trade_messages_negotiation_trade_id ON trade_messages_negotiation (trade_id, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_user_ratings_rated_user_id ON user_ratings (rated_user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_user_reports_reported_user_id ON user_reports (reported_user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_user_bans_user_id ON user_bans (user_id, is_active)")
+    print("✅ Secondary indexes created")
+
     conn.commit()
     conn.close()
 
@@ -0,0 +1,35 @@
+// Function to format date as "Month Day, Year at HH:MM AM/PM"
+function getCurrentDateTime() {
+    const now = new Date();
+
+    // Format: October 24, 2025 at 4:13 PM
+    const options = {
+        year: 'numeric',
+        month: 'long',
+        day: 'numeric',
+        hour: 'numeric',
+        minute: '2-digit',
+        hour12: true
+    };
+
+    return now.toLocaleDateString('en-US', options);
+}
+
+// Set the current date and time when page loads
+document.addEventListener('DOMContentLoaded', function() {
+    const dateTimeField = document.getElementById('currentDateTime');
+    if (dateTimeField) {
+        dateTimeField.value = getCurrentDateTime();
+    }
+
+    // Set maximum date to today for Datebought field
+    const dateBoughtField = document.getElementById('itemDateBought');
+    if (dateBoughtField) {
+        dateBoughtField.max = new Date().toISOString().split('T')[0];
+
+        // Optional: Set a reasonable minimum date (e.g., 50 years ago)
+        const minDate = new Date();
+        minDate.setFullYear(minDate.getFullYear() - 50);
+        dateBoughtField.min = minDate.toISOString().split('T')[0];
+    }
+});
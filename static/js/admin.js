@@ -0,0 +1,304 @@
+// Section Navigation - each tab loads its rows the first time it is opened
+const adminSections = {};
+
+function showSection(sectionName, button) {
+  // Hide all sections
+  document.querySelectorAll('.admin-section').forEach(section => {
+    section.style.display = 'none';
+  });
+
+  // Remove active class from all buttons
+  document.querySelectorAll('.admin-nav-btn').forEach(btn => {
+    btn.classList.remove('active');
+  });
+
+  // Show selected section and activate button
+  document.getElementById(sectionName + '-section').style.display = 'block';
+  button.classList.add('active');
+
+  if (!adminSections[sectionName]) {
+    resetSection(sectionName, '');
+  }
+}
+
+function shortText(value, length) {
+  const text = String(value ?? '');
+  return escapeHtml(text.slice(0, length)) + (text.length > length ? '...' : '');
+}
+
+function badge(text, background, color) {
+  return `<span style="background: ${background}; color: ${color}; padding: 4px 8px; border-radius: 12px; font-size: 11px;">${escapeHtml(text)}</span>`;
+}
+
+const toggleAnnouncementUrl = id => announcementToggleUrl.replace(/0$/, id);
+
+const rowRenderers = {
+  users: user => `
+    <tr>
+      <td>
+        <div style="display: flex; align-items: center; gap: 10px;">
+          <div style="width: 40px; height: 40px; background: linear-gradient(135deg, #0d47a1 0%, #1976d2 100%); color: white; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-weight: bold;">
+            ${escapeHtml((user.full_name || user.username || '?').charAt(0).toUpperCase())}
+          </div>
+          <div>
+            <strong>${escapeHtml(user.full_name || user.username)}</strong>
+            <br>
+            <small style="color: #666;">@${escapeHtml(user.username)}</small>
+          </div>
+        </div>
+      </td>
+      <td>
+        ${escapeHtml(user.email)}<br>
+        <small style="color: #666;">${escapeHtml(user.contact || 'No contact')}</small>
+      </td>
+      <td>${escapeHtml(user.location || 'Not specified')}</td>
+      <td>${user.created_at ? escapeHtml(user.created_at.slice(0, 10)) : 'N/A'}</td>
+      <td>
+        ${user.is_banned
+          ? '<span style="color: #f44336; font-weight: bold;">❌ Banned</span>'
+          : '<span style="color: #4CAF50; font-weight: bold;">✅ Active</span>'}
+      </td>
+      <td>
+        <span style="background: #ff9800; color: white; padding: 4px 8px; border-radius: 12px; font-size: 12px;">
+          ${user.report_count || 0} reports
+        </span>
+      </td>
+      <td>
+        <div style="display: flex; gap: 5px; flex-wrap: wrap;">
+          <button onclick="viewUserDetails(${user.id})" class="btn-action view">
+            👁️ View
+          </button>
+          ${user.is_banned
+            ? `<button onclick="unbanUser(${user.id})" class="btn-action success">🔓 Unban</button>`
+            : `<button onclick="showBanModal(${user.id}, this.dataset.username)" data-username="${escapeHtml(user.username)}" class="btn-action danger">🔒 Ban</button>`}
+        </div>
+      </td>
+    </tr>`,
+
+  reports: report => `
+    <tr>
+      <td>
+        <strong>${escapeHtml(report.reported_username)}</strong>
+        <br><small>${escapeHtml(report.reported_email)}</small>
+      </td>
+      <td>
+        ${escapeHtml(report.reporter_username)}
+        <br><small>${escapeHtml(report.reporter_email)}</small>
+      </td>
+      <td>#${escapeHtml(report.trade_id)}</td>
+      <td>${badge(report.reason, '#e3f2fd', '#0d47a1')}</td>
+      <td><small>${shortText(report.description, 50)}</small></td>
+      <td>
+        ${report.status === 'pending' ? badge('Pending', '#fff3e0', '#ef6c00')
+          : report.status === 'resolved' ? badge('Resolved', '#e8f5e8', '#2e7d32')
+          : badge(report.status, '#ffebee', '#c62828')}
+      </td>
+      <td>${escapeHtml((report.created_at || '').slice(0, 10))}</td>
+      <td>
+        <div style="display: flex; gap: 5px;">
+          <button onclick="viewReportDetails(${report.id})" class="btn-action view">
+            👁️ View
+          </button>
+          ${report.status === 'pending'
+            ? `<button onclick="resolveReport(${report.id})" class="btn-action success">✅ Resolve</button>` : ''}
+        </div>
+      </td>
+    </tr>`,
+
+  suggestions: suggestion => {
+    const priorityColors = {critical: '#c62828', high: '#ef6c00', medium: '#ff9800'};
+    const statusStyles = {completed: ['#e8f5e8', '#2e7d32'], in_progress: ['#fff3e0', '#ef6c00']};
+    const [statusBackground, statusColor] = statusStyles[suggestion.status] || ['#f5f5f5', '#666'];
+    return `
+    <tr>
+      <td>
+        <strong>${escapeHtml(suggestion.username)}</strong>
+        <br><small>${escapeHtml(suggestion.email)}</small>
+      </td>
+      <td>${badge(suggestion.feedback_type, '#e3f2fd', '#0d47a1')}</td>
+      <td>
+        <span style="color: ${priorityColors[suggestion.priority] || '#666'}; font-weight: bold; text-transform: capitalize;">
+          ${escapeHtml(priorityColors[suggestion.priority] ? suggestion.priority : 'low')}
+        </span>
+      </td>
+      <td>
+        <strong>${escapeHtml(suggestion.title)}</strong>
+        <br><small style="color: #666;">${shortText(suggestion.description, 50)}</small>
+      </td>
+      <td>${badge(suggestion.status, statusBackground, statusColor)}</td>
+      <td>${escapeHtml((suggestion.created_at || '').slice(0, 10))}</td>
+      <td>
+        <div style="display: flex; gap: 5px;">
+          <button onclick="viewSuggestion(${suggestion.id})" class="btn-action view">
+            👁️ View
+          </button>
+          <button onclick="updateSuggestionStatus(${suggestion.id})" class="btn-action success">
+            📝 Update
+          </button>
+        </div>
+      </td>
+    </tr>`;
+  },
+
+  announcements: announcement => {
+    const priorityColors = {urgent: '#c62828', important: '#ef6c00'};
+    return `
+    <tr>
+      <td>
+        <strong>${escapeHtml(announcement.title)}</strong>
+        <br><small>${shortText(announcement.content, 50)}</small>
+      </td>
+      <td>
+        <span style="color: ${priorityColors[announcement.priority] || '#666'}; font-weight: bold; text-transform: capitalize;">
+          ${escapeHtml(priorityColors[announcement.priority] ? announcement.priority : 'normal')}
+        </span>
+      </td>
+      <td>
+        ${announcement.is_active
+          ? '<span style="color: #4CAF50; font-weight: bold;">✅ Active</span>'
+          : '<span style="color: #666; font-weight: bold;">❌ Inactive</span>'}
+      </td>
+      <td>${escapeHtml((announcement.created_at || '').slice(0, 10))}</td>
+      <td>
+        <div style="display: flex; gap: 5px;">
+          <form method="POST" action="${toggleAnnouncementUrl(announcement.id)}" style="display: inline;">
+            ${announcement.is_active
+              ? '<button type="submit" class="btn-action danger">❌ Deactivate</button>'
+              : '<button type="submit" class="btn-action success">✅ Activate</button>'}
+          </form>
+          <button onclick="deleteAnnouncement(${announcement.id})" class="btn-action danger">
+            🗑️ Delete
+          </button>
+        </div>
+      </td>
+    </tr>`;
+  },
+
+  bans: ban => `
+    <tr>
+      <td>
+        <strong>${escapeHtml(ban.username)}</strong>
+        <br><small>${escapeHtml(ban.email)}</small>
+      </td>
+      <td>${escapeHtml(ban.admin_username)}</td>
+      <td>${escapeHtml(ban.reason)}</td>
+      <td>
+        ${ban.is_permanent
+          ? '<span style="color: #c62828; font-weight: bold;">Permanent</span>'
+          : `${escapeHtml(ban.duration_days)} days`}
+      </td>
+      <td>
+        ${ban.is_permanent
+          ? '<span style="color: #c62828; font-weight: bold;">Forever</span>'
+          : escapeHtml(ban.banned_until ? ban.banned_until.slice(0, 10) : 'N/A')}
+      </td>
+      <td>
+        ${ban.is_active
+          ? '<span style="color: #f44336; font-weight: bold;">🔒 Active</span>'
+          : '<span style="color: #4CAF50; font-weight: bold;">✅ Expired</span>'}
+      </td>
+      <td>
+        ${ban.is_active
+          ? `<button onclick="unbanUser(${ban.user_id})" class="btn-action success">🔓 Unban</button>` : ''}
+      </td>
+    </tr>`,
+};
+
+function resetSection(sectionName, query) {
+  adminSections[sectionName] = {query: query, cursor: null, request: 0};
+  document.getElementById(sectionName + '-rows').innerHTML = '';
+  loadSection(sectionName);
+}
+
+async function loadSection(sectionName) {
+  const state = adminSections[sectionName];
+  const requestId = ++state.request;
+  const params = new URLSearchParams({limit: 25});
+  if (state.query) params.set('q', state.query);
+  if (state.cursor) params.set('cursor', state.cursor);
+
+  const response = await fetch(`${adminSectionUrl}${sectionName}?${params}`);
+  const data = await response.json();
+  if (requestId !== state.request) {
+    return;  // a newer search replaced this one
+  }
+
+  const body = document.getElementById(sectionName + '-rows');
+  body.insertAdjacentHTML('beforeend', data.rows.map(rowRenderers[sectionName]).join(''));
+  if (!body.children.length) {
+    body.innerHTML = '<tr><td colspan="8" style="text-align: center; color: #666;">Nothing here yet</td></tr>';
+  }
+
+  state.cursor = data.next_cursor;
+  document.getElementById(sectionName + '-more').style.display = data.next_cursor ? 'inline-block' : 'none';
+}
+
+// Ban User Modal
+function showBanModal(userId, username) {
+  document.getElementById('banUserId').value = userId;
+  document.getElementById('banUserInfo').textContent = `You are about to ban user: ${username}`;
+  document.getElementById('banModal').style.display = 'flex';
+}
+
+function closeBanModal() {
+  document.getElementById('banModal').style.display = 'none';
+  document.getElementById('banForm').reset();
+}
+
+// User Search - filtered on the server, so it covers users beyond the loaded page
+let userSearchTimer = null;
+document.getElementById('userSearch').addEventListener('input', function(e) {
+  clearTimeout(userSearchTimer);
+  userSearchTimer = setTimeout(() => resetSection('users', e.target.value.trim()), 250);
+});
+
+// Placeholder functions for other actions
+function viewUserDetails(userId) {
+  alert('View user details: ' + userId);
+  // Implement user details view
+}
+
+function viewReportDetails(reportId) {
+  alert('View report details: ' + reportId);
+  // Implement report details view
+}
+
+function viewSuggestion(suggestionId) {
+  alert('View suggestion: ' + suggestionId);
+  // Implement suggestion details view
+}
+
+function resolveReport(reportId) {
+  if (confirm('Mark this report as resolved?')) {
+    // Implement report resolution
+    alert('Report resolved: ' + reportId);
+  }
+}
+
+function updateSuggestionStatus(suggestionId) {
+  alert('Update suggestion status: ' + suggestionId);
+  // Implement status update
+}
+
+function unbanUser(userId) {
+  if (confirm('Are you sure you want to unban this user?')) {
+    // Implement unban functionality
+    alert('User unbanned: ' + userId);
+  }
+}
+
+function deleteAnnouncement(announcementId) {
+  if (confirm('Are you sure you want to delete this announcement?')) {
+    // Implement delete functionality
+    alert('Announcement deleted: ' + announcementId);
+  }
+}
+
+resetSection('users', '');
+
+// Close modal when clicking outside
+document.getElementById('banModal').addEventListener('click', function(e) {
+  if (e.target === this) {
+    closeBanModal();
+  }
+});
@@ -0,0 +1,587 @@
+// Without a live event stream the page has to reload to show changes
+function refreshIfNoEvents(delay) {
+    if (!window.EventSource) {
+        setTimeout(() => window.location.reload(), delay);
+    }
+}
+
+function renderNegotiationMessage(message) {
+    const own = message.user_id === currentUserId;
+    const suggestion = message.suggested_location ? `
+        <div style="background: #fff3cd; padding: 8px; border-radius: 4px; margin: 5px 0; font-size: 13px;">
+          📍 Location Suggestion: ${escapeHtml(message.suggested_location)}
+          <button onclick="useSuggestion(this.dataset.location)" data-location="${escapeHtml(message.suggested_location)}"
+                  style="margin-left: 10px; padding: 2px 8px; background: #0d47a1; color: white; border: none; border-radius: 4px; font-size: 11px; cursor: pointer;">
+            Use This
+          </button>
+        </div>` : '';
+
+    return `
+        <div class="message ${own ? 'own-message' : ''}" data-message-id="${message.id}"
+             style="background: ${own ? '#e3f2fd' : 'white'}; padding: 10px; border-radius: 8px; margin-bottom: 10px; border-left: 4px solid ${own ? '#0d47a1' : '#4CAF50'};">
+          <div style="font-weight: bold; color:#0d47a1; margin-bottom: 5px;">${escapeHtml(message.username)}</div>
+          <div style="color:#333; margin-bottom: 5px;">${escapeHtml(message.content)}</div>
+          ${suggestion}
+          <div style="font-size: 11px; color:#666;">${escapeHtml(message.created_at)}</div>
+        </div>`;
+}
+
+function appendNegotiationMessage(message) {
+    const chat = document.querySelector('.chat-messages');
+    if (chat.querySelector(`.message[data-message-id="${message.id}"]`)) return;
+
+    chat.insertAdjacentHTML('beforeend', renderNegotiationMessage(message));
+    chat.scrollTop = chat.scrollHeight;
+}
+
+// The page shows the latest messages; earlier ones are fetched a page at a time
+function loadOlderNegotiationMessages() {
+    const older = document.getElementById('olderMessages');
+    const button = older.querySelector('button');
+
+    fetch(`/trade/${tradeId}/messages?cursor=${encodeURIComponent(button.dataset.cursor)}`)
+    .then(response => response.json())
+    .then(data => {
+        older.insertAdjacentHTML('afterend', data.messages.map(renderNegotiationMessage).join(''));
+        if (data.older_cursor) {
+            button.dataset.cursor = data.older_cursor;
+        } else {
+            older.remove();
+        }
+    })
+    .catch(error => {
+        showNotification('Could not load older messages.', 'error');
+    });
+}
+
+// Live updates: negotiation messages are appended in place, and a status change
+// (from either trader) reloads the page once instead of after every action
+if (window.EventSource) {
+    const events = new EventSource(eventStreamUrl);
+    let statusReload = null;
+
+    events.addEventListener('negotiation_message', function(e) {
+        const message = JSON.parse(e.data);
+        if (message.trade_id === tradeId) {
+            appendNegotiationMessage(message);
+        }
+    });
+
+    events.addEventListener('trade_status', function(e) {
+        const status = JSON.parse(e.data);
+        if (status.trade_id === tradeId) {
+            tradeVersion = status.version;
+            // Both confirmations can arrive together; reload once for all of them
+            clearTimeout(statusReload);
+            statusReload = setTimeout(() => window.location.reload(), 1500);
+        }
+    });
+}
+
+// Enhanced confirmation with validation
+function confirmDetails() {
+    if (confirm('Are you sure you want to confirm these arrangement details? Once both users confirm, the trade will be accepted.')) {
+        // Show loading state
+        showNotification('Confirming details...', 'info');
+
+        fetch(`/trade/${tradeId}/confirm_details`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({version: tradeVersion})
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok: ' + response.status);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.status === 'success') {
+                tradeVersion = data.version;
+                showNotification(data.message, 'success');
+                // The trade_status event reloads the page with the updated status
+                refreshIfNoEvents(2000);
+            } else {
+                showNotification(data.message || 'Failed to confirm details.', 'error');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showNotification('Error confirming details. Please try again.', 'error');
+        });
+    }
+}
+
+// Enhanced mark received with tracking
+function markReceived() {
+    const trackingNumber = prompt('Optional: Enter tracking number if available:\n\n📦 Leave blank if not applicable.', '');
+
+    if (trackingNumber === null) {
+        console.log('User cancelled the operation');
+        return; // User clicked cancel
+    }
+
+    if (confirm('Have you received the item from the other trader?')) {
+        console.log('User confirmed receipt');
+
+        // Show loading state
+        showNotification('Marking item as received...', 'info');
+
+        const data = {version: tradeVersion};
+        if (trackingNumber && trackingNumber.trim() !== '') {
+            data.tracking_number = trackingNumber.trim();
+            console.log('Tracking number provided:', data.tracking_number);
+        } else {
+            console.log('No tracking number provided');
+        }
+
+        fetch(`/trade/${tradeId}/confirm_receipt`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(data)
+        })
+        .then(response => {
+            console.log('Response status:', response.status);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            console.log('Response data:', data);
+            if (data.version !== undefined) {
+                tradeVersion = data.version;
+            }
+            if (data.status === 'completed') {
+                showNotification(data.message, 'success');
+                refreshIfNoEvents(3000);
+            } else if (data.status === 'waiting') {
+                showNotification(data.message, 'success');
+                refreshIfNoEvents(2000);
+            } else {
+                showNotification(data.message || 'Failed to mark item as received.', 'error');
+            }
+        })
+        .catch(error => {
+            console.error('Fetch error:', error);
+            showNotification('Network error. Please check console for details.', 'error');
+        });
+    } else {
+        console.log('User cancelled receipt confirmation');
+    }
+}
+
+function suggestLocation() {
+    const location = prompt('Enter your suggested location:');
+    if (location && location.trim()) {
+        fetch(`/trade/${tradeId}/suggest_location`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({location: location.trim()})
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.status === 'success') {
+                showNotification('Location suggestion sent!', 'success');
+                refreshIfNoEvents(1500);
+            } else {
+                showNotification('Failed to send location suggestion.', 'error');
+            }
+        })
+        .catch(error => {
+            showNotification('Network error. Please try again.', 'error');
+        });
+    }
+}
+
+function useSuggestion(location) {
+    if (confirm(`Use this suggested location: "${location}"?`)) {
+        document.querySelector('input[name="meetup_location"]').value = location;
+        document.getElementById('method').value = 'meetup';
+        selectMethod('meetup');
+        showNotification('Location applied to meetup details!', 'success');
+    }
+}
+
+// Enhanced trade cancellation
+function cancelTrade() {
+    const reason = prompt('Please provide a reason for cancellation (optional):');
+    const confirmation = confirm('Are you sure you want to cancel this trade? This action cannot be undone.');
+
+    if (confirmation) {
+        fetch(`/trade/${tradeId}/cancel`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({reason: reason, version: tradeVersion})
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Network response was not ok');
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (data.status === 'success') {
+                showNotification('Trade cancelled successfully!', 'success');
+                setTimeout(() => {
+                    window.location.href = '/trade_history';
+                }, 2000);
+            } else {
+                showNotification('Failed to cancel trade. Please try again.', 'error');
+            }
+        })
+        .catch(error => {
+            showNotification('Network error. Please try again.', 'error');
+        });
+    }
+}
+
+// Enhanced method selection with auto-save
+function selectMethod(method) {
+    document.getElementById('method').value = method;
+
+    // Update method option styles
+    document.querySelectorAll('.method-option').forEach(option => {
+        option.style.borderColor = '#e0e0e0';
+        option.style.background = 'white';
+    });
+
+    const selectedOption = document.querySelector(`.method-option[onclick="selectMethod('${method}')"]`);
+    if (selectedOption) {
+        selectedOption.style.borderColor = '#0d47a1';
+        selectedOption.style.background = '#e3f2fd';
+    }
+
+    // Show/hide sections
+    document.querySelectorAll('.method-section').forEach(section => {
+        section.style.display = 'none';
+    });
+
+    if (method === 'meetup') {
+        document.getElementById('meetupSection').style.display = 'block';
+    } else if (method === 'delivery') {
+        document.getElementById('deliverySection').style.display = 'block';
+    } else if (method === 'mixed') {
+        document.getElementById('meetupSection').style.display = 'block';
+        document.getElementById('deliverySection').style.display = 'block';
+    }
+}
+
+// Location picker integration
+function openLocationPicker() {
+    if (navigator.geolocation) {
+        navigator.geolocation.getCurrentPosition(
+            (position) => {
+                const lat = position.coords.latitude;
+                const lng = position.coords.longitude;
+                const location = `${lat}, ${lng}`;
+
+                if (confirm(`Use your current location? ${location}`)) {
+                    document.querySelector('input[name="meetup_location"]').value = `GPS: ${location}`;
+                    document.getElementById('method').value = 'meetup';
+                    selectMethod('meetup');
+                }
+            },
+            (error) => {
+                alert('Unable to get your location. Please enter it manually.');
+            }
+        );
+    } else {
+        alert('Geolocation is not supported by your browser.');
+    }
+}
+
+// Print arrangement details
+function printArrangement() {
+    const printContent = document.getElementById('arrangementPrint').innerHTML + `
+        <p><em>Printed on: ${new Date().toLocaleString()}</em></p>
+    `;
+
+    const printWindow = window.open('', '_blank');
+    printWindow.document.write(`
+        <html>
+            <head>
+                <title>Trade Arrangement - ${tradeId}</title>
+                <style>
+                    body { font-family: Arial, sans-serif; padding: 20px; }
+                    h2 { color: #0d47a1; }
+                    h3 { color: #1976d2; margin-top: 20px; }
+                    p { margin: 8px 0; }
+                </style>
+            </head>
+            <body>${printContent}</body>
+        </html>
+    `);
+    printWindow.document.close();
+    printWindow.print();
+}
+
+// Enhanced suggestion system
+function suggestDate() {
+    const today = new Date();
+    const nextWeek = new Date(today.getTime() + 7 * 24 * 60 * 60 * 1000);
+    const formattedDate = nextWeek.toISOString().split('T')[0];
+
+    const suggestedDate = prompt('Suggest a date (YYYY-MM-DD):', formattedDate);
+    if (suggestedDate) {
+        const message = `I suggest we schedule for ${suggestedDate}. Does this work for you?`;
+        sendSuggestionMessage(message);
+    }
+}
+
+// Send message function
+function sendMessage() {
+    const messageInput = document.getElementById('chatMessage');
+    const message = messageInput.value.trim();
+
+    if (!message) {
+        showNotification('Please enter a message.', 'warning');
+        return;
+    }
+
+    // Show sending indicator
+    const sendBtn = document.querySelector('.chat-input button');
+    const originalText = sendBtn.textContent;
+    sendBtn.textContent = 'Sending...';
+    sendBtn.disabled = true;
+
+    fetch(`/trade/${tradeId}/send_message`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({message: message})
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.json();
+    })
+    .then(data => {
+        sendBtn.textContent = originalText;
+        sendBtn.disabled = false;
+
+        if (data.status === 'success') {
+            messageInput.value = '';
+            refreshIfNoEvents(0);
+        } else {
+            showNotification('Failed to send message. Please try again.', 'error');
+        }
+    })
+    .catch(error => {
+        sendBtn.textContent = originalText;
+        sendBtn.disabled = false;
+        showNotification('Network error. Please check your connection.', 'error');
+    });
+}
+
+function sendSuggestionMessage(message) {
+    fetch(`/trade/${tradeId}/send_message`, {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({message: message})
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Network response was not ok');
+        }
+        return response.json();
+    })
+    .then(data => {
+        if (data.status === 'success') {
+            showNotification('Suggestion sent successfully!', 'success');
+            refreshIfNoEvents(1500);
+        } else {
+            showNotification('Failed to send suggestion.', 'error');
+        }
+    })
+    .catch(error => {
+        showNotification('Network error. Please try again.', 'error');
+    });
+}
+
+// Notification system
+function showNotification(message, type = 'info') {
+    // Remove existing notifications
+    const existingNotifications = document.querySelectorAll('.custom-notification');
+    existingNotifications.forEach(notif => notif.remove());
+
+    const notification = document.createElement('div');
+    notification.className = `custom-notification`;
+    notification.style.cssText = `
+        position: fixed;
+        top: 20px;
+        right: 20px;
+        padding: 15px 20px;
+        border-radius: 8px;
+        color: white;
+        font-weight: bold;
+        z-index: 10000;
+        max-width: 300px;
+        box-shadow: 0 4px 15px rgba(0,0,0,0.2);
+        animation: slideIn 0.3s ease;
+    `;
+
+    // Set colors based on type
+    const colors = {
+        success: 'linear-gradient(135deg, #4CAF50 0%, #66BB6A 100%)',
+        error: 'linear-gradient(135deg, #f44336 0%, #ef5350 100%)',
+        warning: 'linear-gradient(135deg, #ff9800 0%, #ffb74d 100%)',
+        info: 'linear-gradient(135deg, #0d47a1 0%, #1976d2 100%)'
+    };
+
+    notification.style.background = colors[type] || colors.info;
+    notification.textContent = message;
+
+    document.body.appendChild(notification);
+
+    // Auto-remove after 5 seconds
+    setTimeout(() => {
+        if (notification.parentNode) {
+            notification.style.animation = 'slideOut 0.3s ease';
+            setTimeout(() => notification.remove(), 300);
+        }
+    }, 5000);
+}
+
+// Add CSS animations
+const style = document.createElement('style');
+style.textContent = `
+    @keyframes slideIn {
+        from { transform: translateX(100%); opacity: 0; }
+        to { transform: translateX(0); opacity: 1; }
+    }
+    @keyframes slideOut {
+        from { transform: translateX(0); opacity: 1; }
+        to { transform: translateX(100%); opacity: 0; }
+    }
+
+    .method-option:hover {
+        border-color: #0d47a1 !important;
+        background: #f0f8ff !important;
+        transform: translateY(-2px);
+        box-shadow: 0 4px 15px rgba(13, 71, 161, 0.2);
+        transition: all 0.3s ease;
+    }
+
+    button:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 4px 15px rgba(0,0,0,0.2);
+        transition: all 0.3s ease;
+    }
+
+    .chat-messages::-webkit-scrollbar {
+        width: 6px;
+    }
+
+    .chat-messages::-webkit-scrollbar-track {
+        background: #f1f1f1;
+        border-radius: 3px;
+    }
+
+    .chat-messages::-webkit-scrollbar-thumb {
+        background: #0d47a1;
+        border-radius: 3px;
+    }
+
+    .chat-messages::-webkit-scrollbar-thumb:hover {
+        background: #1976d2;
+    }
+
+    /* Responsive design */
+    @media (max-width: 768px) {
+        .overlay > div:first-child {
+            grid-template-columns: 1fr !important;
+            gap: 15px !important;
+        }
+
+        .method-options {
+            grid-template-columns: 1fr !important;
+        }
+
+        .status-grid {
+            grid-template-columns: 1fr 1fr !important;
+        }
+    }
+
+    /* Enhanced form styling */
+    input:focus, textarea:focus, select:focus {
+        border-color: #0d47a1 !important;
+        box-shadow: 0 0 0 2px rgba(13, 71, 161, 0.2) !important;
+        outline: none;
+    }
+
+    /* Chat message animations */
+    .message {
+        animation: messageSlideIn 0.3s ease;
+    }
+
+    @keyframes messageSlideIn {
+        from {
+            opacity: 0;
+            transform: translateY(10px);
+        }
+        to {
+            opacity: 1;
+            transform: translateY(0);
+        }
+    }
+`;
+document.head.appendChild(style);
+
+// Form auto-save setup
+document.addEventListener('DOMContentLoaded', function() {
+    // Initialize method selection
+    if (initialMethod) {
+        selectMethod(initialMethod);
+    }
+
+    // Add form validation on submit
+    const arrangementForm = document.getElementById('arrangementForm');
+    if (arrangementForm) {
+        arrangementForm.addEventListener('submit', function(e) {
+            const method = document.getElementById('method').value;
+            if (!method) {
+                e.preventDefault();
+                showNotification('Please select an exchange method.', 'warning');
+                return false;
+            }
+        });
+    }
+
+    // Focus on chat input when page loads if there are messages
+    if (hasNegotiationMessages) {
+        setTimeout(() => {
+            const chatInput = document.getElementById('chatMessage');
+            if (chatInput) chatInput.focus();
+        }, 500);
+    }
+});
+
+// Keyboard shortcuts
+document.addEventListener('keydown', function(e) {
+    // Ctrl+Enter to send message
+    if (e.ctrlKey && e.key === 'Enter') {
+        const chatInput = document.getElementById('chatMessage');
+        if (document.activeElement === chatInput && chatInput.value.trim()) {
+            sendMessage();
+        }
+    }
+
+    // Escape to clear chat input
+    if (e.key === 'Escape') {
+        const chatInput = document.getElementById('chatMessage');
+        if (document.activeElement === chatInput) {
+            chatInput.value = '';
+            chatInput.blur();
+        }
+    }
+});
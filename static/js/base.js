@@ -0,0 +1,12 @@
+// Auto-hide flash messages after 5 seconds
+document.addEventListener('DOMContentLoaded', function() {
+    const flashMessages = document.querySelectorAll('.flash-message');
+    flashMessages.forEach(message => {
+        setTimeout(() => {
+            if (message.parentElement) {
+                message.style.animation = 'slideOutRight 0.3s ease-in';
+                setTimeout(() => message.remove(), 300);
+            }
+        }, 5000);
+    });
+});
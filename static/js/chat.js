@@ -0,0 +1,104 @@
+const chatMessages = document.getElementById('chatMessages');
+
+function renderMessage(message) {
+  const side = message.mine ? 'flex-end' : 'flex-start';
+  const colors = message.mine ? 'background-color: #0d47a1; color: white;' : 'background-color: #e0e0e0; color: #333;';
+  return `
+    <div class="chat-message" data-message-id="${message.message_id}" style="margin-bottom: 15px; display: flex; justify-content: ${side};">
+      <div style="max-width: 70%; padding: 10px 15px; border-radius: 18px; ${colors}">
+        <div style="font-size: 0.9em; margin-bottom: 5px; opacity: 0.8;">${message.mine ? 'You' : escapeHtml(partnerName)}</div>
+        <div style="word-wrap: break-word;">${escapeHtml(message.message_text)}</div>
+        <div style="font-size: 0.8em; margin-top: 5px; opacity: 0.7; text-align: ${message.mine ? 'right' : 'left'};">
+          ${escapeHtml(message.message_date)}
+        </div>
+      </div>
+    </div>`;
+}
+
+function messageIds() {
+  return Array.from(chatMessages.querySelectorAll('.chat-message'), el => Number(el.dataset.messageId));
+}
+
+// Append messages newer than what is on screen, skipping ones already shown
+function appendMessages(messages) {
+  const shown = new Set(messageIds());
+  const fresh = messages.filter(message => !shown.has(message.message_id));
+  if (!fresh.length) return;
+
+  const atBottom = chatMessages.scrollHeight - chatMessages.scrollTop - chatMessages.clientHeight < 50;
+  document.getElementById('noMessages').insertAdjacentHTML('beforebegin', fresh.map(renderMessage).join(''));
+  document.getElementById('noMessages').style.display = 'none';
+  if (atBottom || fresh.some(message => message.mine)) {
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+  }
+}
+
+async function loadOlderMessages() {
+  const ids = messageIds();
+  const response = await fetch(`${messagesUrl}?before=${ids.length ? ids[0] : ''}`);
+  const data = await response.json();
+
+  const previousHeight = chatMessages.scrollHeight;
+  document.getElementById('loadOlder').insertAdjacentHTML('afterend', data.messages.map(renderMessage).join(''));
+  chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+  document.getElementById('loadOlder').style.display = data.has_more ? 'block' : 'none';
+}
+
+// Fetch only the messages after the newest one on screen
+async function pollMessages() {
+  const ids = messageIds();
+  const after = ids.length ? ids[ids.length - 1] : 0;
+  try {
+    const response = await fetch(`${messagesUrl}?after=${after}`);
+    if (response.ok) {
+      const data = await response.json();
+      appendMessages(data.messages);
+      if (data.has_more) return pollMessages();
+    }
+  } catch (e) {
+    // Try again on the next tick
+  }
+}
+
+// Send without reloading the page; fall back to a normal submit on failure
+document.getElementById('chatForm').addEventListener('submit', async function(e) {
+  e.preventDefault();
+  const textarea = this.querySelector('textarea');
+  const messageText = textarea.value.trim();
+  if (!messageText) return;
+
+  try {
+    const response = await fetch(messagesUrl, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({message_text: messageText})
+    });
+    if (!response.ok) throw new Error(response.statusText);
+    const data = await response.json();
+    appendMessages([data.message]);
+    textarea.value = '';
+  } catch (err) {
+    this.submit();
+  }
+});
+
+// Scroll to bottom of chat messages
+window.onload = function() {
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+};
+
+// New messages are pushed over /events; each push fetches the delta so the
+// conversation is marked read. Browsers without EventSource fall back to polling.
+if (window.EventSource) {
+  const events = new EventSource(eventStreamUrl);
+  events.addEventListener('chat_message', function(e) {
+    const message = JSON.parse(e.data);
+    if (message.sender_id === partnerId || message.receiver_id === partnerId) {
+      pollMessages();
+    }
+  });
+  // Catch up on anything sent while the stream was reconnecting
+  events.addEventListener('open', pollMessages);
+} else {
+  setInterval(pollMessages, 3000);
+}
@@ -0,0 +1,131 @@
+// Star rating functionality
+document.addEventListener('DOMContentLoaded', function() {
+    // Star rating interaction
+    document.querySelectorAll('.star-rating').forEach(star => {
+        star.addEventListener('mouseenter', function() {
+            const rating = parseInt(this.getAttribute('data-rating'));
+            const stars = this.parentElement.parentElement.querySelectorAll('.star-rating');
+            stars.forEach((s, index) => {
+                s.style.color = index < rating ? '#ff9800' : '#ddd';
+            });
+        });
+
+        star.addEventListener('click', function() {
+            const rating = parseInt(this.getAttribute('data-rating'));
+            const radio = this.parentElement.querySelector('input[type="radio"]');
+            radio.checked = true;
+
+            const stars = this.parentElement.parentElement.querySelectorAll('.star-rating');
+            stars.forEach((s, index) => {
+                s.style.color = index < rating ? '#ff9800' : '#ddd';
+            });
+        });
+    });
+
+    // Reset stars when leaving the group
+    document.querySelectorAll('.star-rating').forEach(star => {
+        star.parentElement.parentElement.addEventListener('mouseleave', function() {
+            const checked = this.querySelector('input[type="radio"]:checked');
+            const stars = this.querySelectorAll('.star-rating');
+
+            if (checked) {
+                const rating = parseInt(checked.value);
+                stars.forEach((s, index) => {
+                    s.style.color = index < rating ? '#ff9800' : '#ddd';
+                });
+            } else {
+                stars.forEach(s => s.style.color = '#ddd');
+            }
+        });
+    });
+});
+
+// Report modal functionality
+function openReportModal(userId) {
+    document.getElementById('reported_user_id').value = userId;
+    document.getElementById('reportModal').style.display = 'flex';
+}
+
+function closeReportModal() {
+    document.getElementById('reportModal').style.display = 'none';
+    document.getElementById('reportForm').reset();
+}
+
+// View user rating details
+function viewUserRating(userId) {
+    fetch(`/get_user_rating_stats/${userId}`)
+        .then(response => response.json())
+        .then(data => {
+            const modal = document.createElement('div');
+            modal.style.cssText = `
+                position: fixed; top: 0; left: 0; width: 100%; height: 100%;
+                background: rgba(0,0,0,0.5); z-index: 1000;
+                display: flex; justify-content: center; align-items: center;
+            `;
+
+            modal.innerHTML = `
+                <div style="background: white; padding: 30px; border-radius: 12px; max-width: 500px; width: 90%; max-height: 90vh; overflow-y: auto;">
+                    <h3 style="color:#0d47a1; margin-top:0; margin-bottom:20px;">User Rating Details</h3>
+
+                    <div style="text-align: center; margin-bottom: 20px;">
+                        <div style="font-size: 48px; color: #ff9800; margin-bottom: 10px;">⭐</div>
+                        <div style="font-size: 32px; font-weight: bold; color: #0d47a1; margin-bottom: 5px;">
+                            ${data.average_rating}/5.0
+                        </div>
+                        <p style="color:#666; margin:0;">Based on ${data.total_ratings} ratings</p>
+                    </div>
+
+                    <div style="margin-bottom: 20px;">
+                        <h4 style="color:#0d47a1; margin-bottom:15px;">Rating Breakdown</h4>
+                        <div style="display: grid; gap: 8px;">
+                            ${[5,4,3,2,1].map(stars => `
+                                <div style="display: flex; align-items: center; gap: 10px;">
+                                    <span style="color: #ff9800; font-weight: bold;">${stars}★</span>
+                                    <div style="flex: 1; background: #f0f0f0; border-radius: 10px; height: 8px; overflow: hidden;">
+                                        <div style="background: #ff9800; height: 100%; width: ${(data.rating_breakdown[stars + '_star'] / (data.total_ratings || 1)) * 100}%; border-radius: 10px;"></div>
+                                    </div>
+                                    <span style="font-size: 12px; color: #666; min-width: 30px;">${data.rating_breakdown[stars + '_star']}</span>
+                                </div>
+                            `).join('')}
+                        </div>
+                    </div>
+
+                    ${data.recent_comments.length > 0 ? `
+                    <div>
+                        <h4 style="color:#0d47a1; margin-bottom:15px;">Recent Comments</h4>
+                        <div style="display: grid; gap: 10px;">
+                            ${data.recent_comments.map(comment => `
+                                <div style="background: #f8f9fa; padding: 10px; border-radius: 6px;">
+                                    <div style="color: #ff9800; margin-bottom: 5px;">
+                                        ${'★'.repeat(comment.rating)}${'☆'.repeat(5 - comment.rating)}
+                                    </div>
+                                    <p style="margin:0; color:#333; font-style: italic;">"${comment.comment}"</p>
+                                    <div style="font-size: 12px; color: #666; margin-top: 5px;">
+                                        - ${comment.full_name || comment.username}
+                                    </div>
+                                </div>
+                            `).join('')}
+                        </div>
+                    </div>
+                    ` : ''}
+
+                    <button onclick="this.parentElement.parentElement.remove()" class="btn-primary" style="width: 100%; padding: 12px; background: #546e7a; color: white; border: none; border-radius: 6px; font-weight: bold; cursor: pointer; margin-top: 20px;">
+                        Close
+                    </button>
+                </div>
+            `;
+
+            document.body.appendChild(modal);
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Error loading user rating details.');
+        });
+}
+
+// Close modal when clicking outside
+document.addEventListener('click', function(event) {
+    if (event.target.id === 'reportModal') {
+        closeReportModal();
+    }
+});
@@ -0,0 +1,39 @@
+// Search functionality
+document.getElementById('searchItems').addEventListener('input', function(e) {
+    const searchTerm = e.target.value.toLowerCase();
+    const items = document.querySelectorAll('.item-card');
+    let visibleCount = 0;
+
+    items.forEach(item => {
+        const itemName = item.getAttribute('data-name');
+        if (itemName.includes(searchTerm)) {
+            item.style.display = 'block';
+            visibleCount++;
+        } else {
+            item.style.display = 'none';
+        }
+    });
+
+    document.getElementById('noResults').style.display = visibleCount === 0 ? 'block' : 'none';
+});
+
+// Sort functionality
+document.getElementById('sortBy').addEventListener('change', function(e) {
+    const sortBy = e.target.value;
+    const grid = document.getElementById('itemsGrid');
+    const items = Array.from(grid.querySelectorAll('.item-card'));
+
+    items.sort((a, b) => {
+        if (sortBy === 'name') {
+            return a.getAttribute('data-name').localeCompare(b.getAttribute('data-name'));
+        } else if (sortBy === 'newest') {
+            return new Date(b.getAttribute('data-date')) - new Date(a.getAttribute('data-date'));
+        } else if (sortBy === 'oldest') {
+            return new Date(a.getAttribute('data-date')) - new Date(b.getAttribute('data-date'));
+        }
+        return 0;
+    });
+
+    // Re-append sorted items
+    items.forEach(item => grid.appendChild(item));
+});
@@ -0,0 +1,8 @@
+// Helpers shared by the page scripts; include this before them
+
+// Escape text for interpolation into HTML built in a template literal
+function escapeHtml(value) {
+  return String(value ?? '').replace(/[&<>"']/g, ch => ({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+  }[ch]));
+}